@@ -1,4 +1,5 @@
-import moviepy.editor as mp
+import subprocess
+from imageio_ffmpeg import get_ffmpeg_exe
 import speech_recognition as sr
 from nltk.sentiment import SentimentIntensityAnalyzer
 import nltk
@@ -10,17 +11,17 @@ nltk.download('vader_lexicon')
 def video_to_text(video_file, output_text_file):
 
     try:
-        video = mp.VideoFileClip(video_file)
-        audio_file = "temp_audio.wav"
-        video.audio.write_audiofile(audio_file)
+        # Decode straight to 16 kHz mono PCM in memory instead of temp_audio.wav
+        command = [get_ffmpeg_exe(), "-nostdin", "-loglevel", "error", "-i", video_file,
+                   "-vn", "-ac", "1", "-ar", "16000", "-f", "s16le", "-acodec", "pcm_s16le", "-"]
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        audio_data = sr.AudioData(process.stdout, 16000, 2)
     except Exception as e:
         return f"Error in extracting audio: {e}"
 
     recognizer = sr.Recognizer()
     try:
-        with sr.AudioFile(audio_file) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
+        text = recognizer.recognize_google(audio_data)
     except Exception as e:
         return f"Error in audio transcription: {e}"
 
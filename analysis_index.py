@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+from pdf_cache import file_digest
+
+INDEX_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    digest TEXT NOT NULL,
+    version TEXT NOT NULL,
+    name TEXT NOT NULL,
+    emails TEXT NOT NULL,
+    phones TEXT NOT NULL,
+    links TEXT NOT NULL,
+    text BLOB NOT NULL,
+    PRIMARY KEY (digest, version)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    digest TEXT NOT NULL,
+    version TEXT NOT NULL,
+    skills_key TEXT NOT NULL,
+    skills TEXT NOT NULL,
+    PRIMARY KEY (digest, version, skills_key)
+);
+CREATE TABLE IF NOT EXISTS empty_files (
+    digest TEXT NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (digest, version)
+);
+"""
+
+
+def open_index(index_path):
+    if os.path.dirname(index_path):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    conn = sqlite3.connect(index_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+        # Older layouts are cheap to rebuild from the CVs, so drop them.
+        conn.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS profiles; DROP TABLE IF EXISTS matches;")
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def skills_key(user_skills):
+    return hashlib.sha1("\n".join(sorted(user_skills)).encode("utf-8")).hexdigest()
+
+
+def indexed_digest(conn, path):
+    # Re-hash only when size or mtime changed since the file was last seen.
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    row = conn.execute("SELECT size, mtime_ns, digest FROM files WHERE path = ?", (path,)).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        return row[2]
+    digest = file_digest(path)
+    conn.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                 (path, stat.st_size, stat.st_mtime_ns, digest))
+    return digest
+
+
+def has_profile(conn, digest, version):
+    row = conn.execute("SELECT 1 FROM profiles WHERE digest = ? AND version = ?", (digest, version)).fetchone()
+    return row is not None
+
+
+def is_empty(conn, digest, version):
+    row = conn.execute("SELECT 1 FROM empty_files WHERE digest = ? AND version = ?", (digest, version)).fetchone()
+    return row is not None
+
+
+def put_empty(conn, digest, version):
+    # A file that gave no text (a scan read without OCR) has no profile;
+    # this keeps it from being extracted again while it is unchanged.
+    conn.execute("INSERT OR REPLACE INTO empty_files (digest, version) VALUES (?, ?)", (digest, version))
+
+
+def get_profile(conn, digest, version, with_text=True):
+    columns = "name, emails, phones, links, text" if with_text else "name, emails, phones, links"
+    row = conn.execute(f"SELECT {columns} FROM profiles WHERE digest = ? AND version = ?",
+                       (digest, version)).fetchone()
+    if row is None:
+        return None
+    profile = {
+        "Name": row[0],
+        "Emails": json.loads(row[1]),
+        "Phone Numbers": json.loads(row[2]),
+        "Links": json.loads(row[3])
+    }
+    if with_text:
+        profile["Text"] = zlib.decompress(row[4]).decode("utf-8")
+    return profile
+
+
+def put_profile(conn, digest, version, profile):
+    text = zlib.compress(profile["Text"].encode("utf-8"))
+    conn.execute("INSERT OR REPLACE INTO profiles (digest, version, name, emails, phones, links, text) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (digest, version, profile["Name"], json.dumps(profile["Emails"]),
+                  json.dumps(profile["Phone Numbers"]), json.dumps(profile["Links"]), text))
+
+
+def get_skills(conn, digest, version, key):
+    row = conn.execute("SELECT skills FROM matches WHERE digest = ? AND version = ? AND skills_key = ?",
+                       (digest, version, key)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def put_skills(conn, digest, version, key, skills):
+    conn.execute("INSERT OR REPLACE INTO matches (digest, version, skills_key, skills) VALUES (?, ?, ?, ?)",
+                 (digest, version, key, json.dumps(skills)))
@@ -0,0 +1,52 @@
+import contextlib
+import os
+import tempfile
+
+
+def _read_umask():
+    # The umask can only be read by setting it, which races with files other
+    # threads create meanwhile, so it is read once at import.
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# What open() would have given a new file. mkstemp files are 0600, which a
+# dashboard running as another user cannot read.
+DEFAULT_MODE = 0o666 & ~_read_umask()
+
+
+def fsync_dir(path):
+    # Makes a rename inside the directory durable. Not possible on Windows.
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_write(path, binary=False, durable=True):
+    # Yields a file written under a temp name next to path and renamed over
+    # it on success, so readers see the old file or the new one and never
+    # half of one. durable also fsyncs the data and the rename, which a
+    # cache entry that can be rebuilt does not need.
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8") as f:
+            yield f
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(tmp_path, DEFAULT_MODE)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if durable:
+        fsync_dir(directory)
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import final_3
+import pdf_backends
+from contacts import scan_contacts
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Text Converted")
+SKILLS = (
+    "python", "java", "c++", "sql", "javascript", "typescript", "react", "node.js", "django", "flask",
+    "pandas", "numpy", "tensorflow", "pytorch", "scikit-learn", "machine learning", "deep learning",
+    "data analysis", "docker", "kubernetes", "aws", "azure", "git", "linux", "html", "css", "mongodb",
+    "postgresql", "spark", "tableau", "figma", "flutter", "kotlin", "swift", "go", "rust", "excel",
+    "power bi", "nlp", "computer vision"
+)
+FIRST_NAMES = ("Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Sneha", "Arjun", "Meera", "Kabir", "Isha",
+               "James", "Maria", "Chen", "Fatima", "Lucas", "Sofia", "Omar", "Elena", "Noah", "Yuki")
+LAST_NAMES = ("Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Das", "Mehta", "Rao",
+              "Smith", "Garcia", "Wang", "Khan", "Silva", "Rossi", "Haddad", "Petrova", "Brown", "Tanaka")
+LINES_PER_PAGE = 60
+SIZES = (100, 10000, 100000)
+
+
+def load_templates(template_dir=TEMPLATE_DIR):
+    # The sample CVs' text, with their real contact details taken out. The
+    # scanned sample has no text layer and is left out.
+    templates = []
+    for file_name in sorted(os.listdir(template_dir)):
+        if not file_name.endswith(".pdf"):
+            continue
+        text = "".join(page["text"] for page in pdf_backends.extract_pages(os.path.join(template_dir, file_name)))
+        scanned = scan_contacts(text)
+        for value in scanned["emails"] + scanned["phones"] + scanned["urls"]:
+            text = text.replace(value, "")
+        lines = [line.rstrip() for line in text.splitlines() if line.strip()]
+        if len(lines) > 1:
+            # The first line is the sample's own name; a sample that is
+            # nothing else would leave synthetic_cv an empty body to repeat.
+            templates.append(lines[1:])
+    if not templates:
+        raise RuntimeError(f"No usable CV templates in {template_dir}")
+    return templates
+
+
+def synthetic_cv(rng, templates, pages=1, skill_density=0.2):
+    # Returns (lines, skills): a header with a made-up name and contact
+    # line, then template lines with skill lines mixed in, cut to `pages`
+    # pages of LINES_PER_PAGE lines. skill_density is the share of SKILLS
+    # the CV mentions.
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    skills = rng.sample(SKILLS, max(0, min(len(SKILLS), round(skill_density * len(SKILLS)))))
+    phone = f"+91 {rng.randint(70000, 99999)} {rng.randint(10000, 99999)}"
+    lines = [f"{first} {last}", f"{first.lower()}.{last.lower()}{rng.randint(1, 99)}@example.com | {phone}"]
+    if skills:
+        lines.append("Skills: " + ", ".join(skills))
+
+    body = list(rng.choice(templates))
+    total = pages * LINES_PER_PAGE
+    while len(lines) < total:
+        for line in body:
+            if len(lines) >= total:
+                break
+            lines.append(line)
+            if skills and rng.random() < 0.1:
+                lines.append(f"Worked on projects using {rng.choice(skills)}.")
+    return lines[:total], skills
+
+
+def write_pdf(path, lines):
+    import fitz
+
+    doc = fitz.open()
+    for i in range(0, len(lines), LINES_PER_PAGE):
+        page = doc.new_page()
+        page.insert_text((40, 40), "\n".join(lines[i:i + LINES_PER_PAGE]), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def generate_corpus(output_dir, count, file_format="txt", pages=1, skill_density=0.2, seed=0,
+                    template_dir=TEMPLATE_DIR):
+    # The same seed always writes the same files.
+    rng = random.Random(seed)
+    templates = load_templates(template_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    width = len(str(count))
+    for i in range(count):
+        lines, _ = synthetic_cv(rng, templates, pages, skill_density)
+        path = os.path.join(output_dir, f"cv_{i:0{width}d}.{file_format}")
+        if file_format == "pdf":
+            write_pdf(path, lines)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+    return output_dir
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3)
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS; pool workers that
+    # have exited show up under RUSAGE_CHILDREN.
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench_stages(folder_path, skill_set, sample=1000):
+    # Per-document latency of each stage on up to `sample` files.
+    timings = {"extract": [], "analyze": []}
+    for file_name in final_3.list_cv_files(folder_path)[:sample]:
+        started = time.perf_counter()
+        text = final_3.load_cv_text(folder_path, file_name)
+        timings["extract"].append(time.perf_counter() - started)
+        if not text or not text.strip():
+            continue
+        started = time.perf_counter()
+        final_3.analyze_cv(text, skill_set)
+        timings["analyze"].append(time.perf_counter() - started)
+    return {stage: latency_summary(samples) for stage, samples in timings.items()}
+
+
+def run_size(count, file_format="txt", pages=1, skill_density=0.2, seed=0, workers=1, sample=1000,
+             work_dir=None, keep=False):
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="cv_bench_")
+    folder_path = os.path.join(work_dir, f"{count}_{file_format}_{pages}p")
+    skill_set = set(random.Random(seed).sample(SKILLS, 5))
+    try:
+        started = time.perf_counter()
+        generate_corpus(folder_path, count, file_format, pages, skill_density, seed)
+        generate_seconds = time.perf_counter() - started
+
+        final_3.warm_up_models(*final_3.CV_MODELS)
+        stages = bench_stages(folder_path, skill_set, sample)
+
+        started = time.perf_counter()
+        results = final_3.process_folder(folder_path, skill_set, workers=workers)
+        process_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        final_3.rank_resumes(results, skill_set)
+        rank_seconds = time.perf_counter() - started
+        return {
+            "documents": count,
+            "format": file_format,
+            "pages": pages,
+            "skill_density": skill_density,
+            "workers": workers,
+            "generate_seconds": round(generate_seconds, 3),
+            "process_folder": {"seconds": round(process_seconds, 3),
+                               "docs_per_sec": round(count / process_seconds, 1) if process_seconds else None},
+            "rank_resumes": {"seconds": round(rank_seconds, 4),
+                             "docs_per_sec": round(len(results) / rank_seconds, 1) if rank_seconds else None},
+            "stages": stages,
+            "peak_rss_mb": peak_rss_mb()
+        }
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir if own_dir else folder_path, ignore_errors=True)
+
+
+def run_benchmarks(sizes=SIZES, **options):
+    # Each size runs in a fresh process so its peak RSS is its own.
+    reports = []
+    for count in sizes:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            report = executor.submit(run_size, count, **options).result()
+        reports.append(report)
+        print_report(report)
+    return reports
+
+
+def print_report(report):
+    print(f"\n{report['documents']} {report['format']} CVs, {report['pages']} page(s), "
+          f"{report['workers']} worker(s):")
+    print(f"  process_folder  {report['process_folder']['docs_per_sec']} docs/sec "
+          f"({report['process_folder']['seconds']}s)")
+    print(f"  rank_resumes    {report['rank_resumes']['docs_per_sec']} docs/sec "
+          f"({report['rank_resumes']['seconds']}s)")
+    for stage, summary in report["stages"].items():
+        if summary["count"]:
+            print(f"  {stage:<15} p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms "
+                  f"over {summary['count']} docs")
+    print(f"  peak RSS        {report['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency of the resume screening pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--format", choices=("txt", "pdf"), default="txt")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--skill-density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sample", type=int, default=1000, help="documents timed per stage")
+    parser.add_argument("--work-dir")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus")
+    parser.add_argument("--json", help="also write the reports to this file")
+    args = parser.parse_args()
+
+    reports = run_benchmarks(args.sizes, file_format=args.format, pages=args.pages,
+                             skill_density=args.skill_density, seed=args.seed, workers=args.workers,
+                             sample=args.sample, work_dir=args.work_dir, keep=args.keep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
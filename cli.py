@@ -0,0 +1,419 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+
+import benchmark
+import final_3
+import pdf_cache
+import profiling
+import result_sinks
+import service
+import video_batch
+
+EXIT_OK = 0
+# Some CVs or videos could not be analyzed, the rest were written.
+EXIT_PARTIAL = 1
+# Bad arguments (argparse exits with this itself).
+EXIT_USAGE = 2
+# Nothing could be processed.
+EXIT_FAILED = 3
+
+SCREEN_COLUMNS = ("file", "status", "score", "Name", "Emails", "Phone Numbers", "Links", "Skills Found")
+RANK_COLUMNS = ("rank", "file", "score")
+
+
+def read_skills(args):
+    # --skills "python, sql" and/or --skills-file with one skill per line
+    # (commas also work, # starts a comment).
+    raw = []
+    if args.skills:
+        raw.extend(args.skills.split(","))
+    if args.skills_file:
+        with open(args.skills_file, "r", encoding="utf-8") as f:
+            for line in f:
+                raw.extend(line.split("#", 1)[0].split(","))
+    return {skill.strip().lower() for skill in raw if skill.strip()}
+
+
+class RecordWriter:
+    # jsonl and csv rows are written and flushed one at a time so a consumer
+    # can read results while the run is still going; json is one array
+    # written at the end.
+
+    def __init__(self, stream, output_format, columns):
+        self.stream = stream
+        self.format = output_format
+        self.columns = columns
+        self.records = []
+        self.csv = None
+        if output_format == "csv":
+            self.csv = csv.DictWriter(stream, fieldnames=columns, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.format == "jsonl":
+            self.stream.write(json.dumps(record) + "\n")
+        elif self.format == "csv":
+            self.csv.writerow({key: "; ".join(map(str, value)) if isinstance(value, list) else value
+                               for key, value in record.items()})
+        elif self.format == "text":
+            self.stream.write("  ".join(f"{key}: {record[key]}" for key in self.columns if key in record) + "\n")
+        else:
+            self.records.append(record)
+            return
+        self.stream.flush()
+
+    def close(self):
+        if self.format == "json":
+            json.dump(self.records, self.stream, indent=2)
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+@contextlib.contextmanager
+def open_writer(args, columns):
+    if args.output and args.output != "-":
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        stream = open(args.output, "w", encoding="utf-8", newline="")
+    else:
+        stream = args.stdout
+    writer = RecordWriter(stream, args.format, columns)
+    try:
+        yield writer
+    finally:
+        writer.close()
+        if stream is not args.stdout:
+            stream.close()
+
+
+def folder_options(args):
+    cache_dir = None if args.no_cache else args.cache_dir
+    index_path = None if args.no_index else (args.index or os.path.join(args.folder, ".cv_index.sqlite"))
+    return {"workers": args.workers, "batch_size": args.batch_size, "cache_dir": cache_dir, "index_path": index_path,
+            "use_ocr": args.ocr, "pdf_backend": args.pdf_backend, "max_pages": args.max_pages or None,
+            "ner_window": args.ner_window or None}
+
+
+def screen_records(args, skill_set):
+    options = folder_options(args)
+    for file_name, result in final_3.iter_folder_results(args.folder, skill_set, **options):
+        if result is None:
+            yield {"file": file_name, "status": "failed"}
+            continue
+        record = {"file": file_name, "status": "ok", "score": final_3.calculate_score(result, skill_set)}
+        record.update(result)
+        yield record
+    if options["cache_dir"]:
+        pdf_cache.prune_cache(options["cache_dir"])
+
+
+def check_folder(args):
+    if not os.path.isdir(args.folder):
+        print(f"Not a folder: {args.folder}", file=sys.stderr)
+        return False
+    return True
+
+
+def run_screen(args):
+    skill_set = read_skills(args)
+    if not skill_set:
+        print("No skills given, use --skills or --skills-file.", file=sys.stderr)
+        return EXIT_USAGE
+    if not check_folder(args):
+        return EXIT_FAILED
+    if args.format is None:
+        args.format = result_sinks.format_for(args.output or "") or "jsonl"
+    if args.format in result_sinks.FORMATS and args.output and args.output != "-":
+        return run_screen_to_sink(args, skill_set)
+    if args.format not in ("jsonl", "json", "csv", "text"):
+        print(f"--format {args.format} needs --output.", file=sys.stderr)
+        return EXIT_USAGE
+    ok = failed = 0
+    with open_writer(args, SCREEN_COLUMNS) as writer:
+        for record in screen_records(args, skill_set):
+            writer.write(record)
+            if record["status"] == "ok":
+                ok += 1
+            else:
+                failed += 1
+    print(f"Screened {ok} CVs, {failed} failed.", file=sys.stderr)
+    return exit_status(ok, failed)
+
+
+def run_screen_to_sink(args, skill_set):
+    # Written as it goes and resumed on a rerun, see result_sinks.
+    if args.ranking and result_sinks.format_for(args.ranking) is None:
+        print(f"--ranking needs a .jsonl, .parquet or .arrow path, not {args.ranking}.", file=sys.stderr)
+        return EXIT_USAGE
+    summary = result_sinks.screen_to_sink(args.folder, skill_set, args.output, args.ranking, args.top_k,
+                                          args.format, not args.restart, args.checkpoint_every,
+                                          **folder_options(args))
+    print(f"Screened {summary['analyzed']} CVs, {summary['failed']} failed, "
+          f"{summary['reused']} reused from {args.output}.", file=sys.stderr)
+    return exit_status(summary["analyzed"] + summary["reused"], summary["failed"])
+
+
+def load_results(path):
+    # Reads back screen output (jsonl, json, or a Parquet/Arrow directory)
+    # as {file: result}.
+    # A file screened more than once counts with its last record.
+    if result_sinks.format_for(path) in ("parquet", "arrow"):
+        records = result_sinks.read_records(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = f.read()
+        if data.lstrip().startswith("["):
+            records = json.loads(data)
+        else:
+            records = [json.loads(line) for line in data.splitlines() if line.strip()]
+    return {file_name: record for file_name, record in result_sinks.latest_records(records).items()
+            if record.get("status", "ok") == "ok"}
+
+
+def run_rank(args):
+    skill_set = read_skills(args)
+    if not skill_set:
+        print("No skills given, use --skills or --skills-file.", file=sys.stderr)
+        return EXIT_USAGE
+    failed = 0
+    if args.results:
+        # "Skills Found" only holds the skills the CVs were screened for,
+        # any other skill would score 0 for everyone.
+        screened = result_sinks.screened_skills(args.results)
+        if screened is None:
+            print(f"Warning: {args.results} does not record the skills it was screened for; skills outside "
+                  f"them score 0.", file=sys.stderr)
+        elif not skill_set <= screened:
+            print(f"{args.results} was screened for {', '.join(sorted(screened))}, not for "
+                  f"{', '.join(sorted(skill_set - screened))}; screen the CVs again for those skills.",
+                  file=sys.stderr)
+            return EXIT_USAGE
+        results = load_results(args.results)
+    else:
+        if not args.folder:
+            print("Give a CV folder or --results from an earlier screen run.", file=sys.stderr)
+            return EXIT_USAGE
+        if not check_folder(args):
+            return EXIT_FAILED
+        results = {}
+        for record in screen_records(args, skill_set):
+            if record["status"] == "ok":
+                results[record["file"]] = record
+            else:
+                failed += 1
+    ranked = final_3.rank_resumes(results, skill_set, args.top_k)
+    with open_writer(args, RANK_COLUMNS) as writer:
+        for rank, (file_name, score) in enumerate(ranked, start=1):
+            writer.write({"rank": rank, "file": file_name, "score": score})
+    return exit_status(len(results), failed)
+
+
+def run_video(args):
+    options = {"sample_every": args.sample_every, "batch_size": args.batch_size, "backend": args.backend,
+               "chunk_seconds": args.chunk_seconds}
+    try:
+        final_3.check_video_options(args.sample_every, args.chunk_seconds)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return EXIT_USAGE
+    if os.path.isfile(args.source) and args.source.lower().endswith(video_batch.VIDEO_EXTENSIONS):
+        face_detector = final_3.make_face_detector(args.detector, args.detect_max_width, args.detect_every)
+        result = final_3.analyze_video_resume(args.source, args.transcript, face_detector=face_detector,
+                                              **options)
+        record = {"video": args.source, "error": None}
+        record.update(result)
+        if result["transcript"].startswith("Error"):
+            record["error"] = result["transcript"]
+        with open_writer(args, ("video", "error", "emotions_detected", "sentiment_analysis", "transcript")) as w:
+            w.write(record)
+        return EXIT_PARTIAL if record["error"] else EXIT_OK
+
+    if not os.path.exists(args.source):
+        print(f"No such video, folder or manifest: {args.source}", file=sys.stderr)
+        return EXIT_FAILED
+    if not args.output or args.output == "-":
+        print("A folder or manifest needs --output results.jsonl (it is appended to and resumed).",
+              file=sys.stderr)
+        return EXIT_USAGE
+    if args.detect_every > 1:
+        # Frames of one video go to different detect workers, so there is
+        # no previous detection to track from.
+        print("--detect-every only applies to a single video.", file=sys.stderr)
+        return EXIT_USAGE
+    summary = video_batch.run_video_batch(args.source, args.output, detector_backend=args.detector,
+                                          detect_max_width=args.detect_max_width, **options)
+    print(json.dumps(summary), file=args.stdout)
+    return exit_status(summary["analyzed"] - summary["failed"], summary["failed"])
+
+
+def run_benchmark(args):
+    reports = benchmark.run_benchmarks(args.sizes, file_format=args.corpus_format, pages=args.pages,
+                                       skill_density=args.skill_density, seed=args.seed, workers=args.workers,
+                                       sample=args.sample, work_dir=args.work_dir, keep=args.keep)
+    with open_writer(args, ("documents", "format", "pages", "workers", "peak_rss_mb")) as writer:
+        for report in reports:
+            writer.write(report)
+    return EXIT_OK
+
+
+def run_serve(args):
+    service.serve(args.host, args.port, args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                  max_queue=args.max_queue, video_workers=args.video_workers, ner_window=args.ner_window or None,
+                  cache_dir=None if args.no_cache else args.cache_dir, pdf_backend=args.pdf_backend,
+                  max_pages=args.max_pages or None, use_ocr=args.ocr, video=not args.no_video,
+                  log_requests=args.log_requests)
+    return EXIT_OK
+
+
+def exit_status(ok, failed):
+    if not ok and failed:
+        return EXIT_FAILED
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def add_output_options(parser, default_format="jsonl", formats=("jsonl", "json", "csv", "text")):
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--format", choices=formats, default=default_format)
+
+
+def add_folder_options(parser, folder_required=True):
+    if folder_required:
+        parser.add_argument("folder", help="folder of CVs (PDF and/or TXT)")
+    else:
+        parser.add_argument("folder", nargs="?", help="folder of CVs (PDF and/or TXT)")
+    parser.add_argument("--skills", help="comma-separated skills")
+    parser.add_argument("--skills-file", help="file with one skill per line")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--cache-dir", default=pdf_cache.DEFAULT_CACHE_DIR, help="PDF text cache")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--index", help="analysis index path (default: <folder>/.cv_index.sqlite)")
+    parser.add_argument("--no-index", action="store_true")
+    parser.add_argument("--ocr", action="store_true", help="OCR scanned PDF pages")
+    parser.add_argument("--pdf-backend", choices=("auto", "pymupdf", "pypdf", "pdfplumber"),
+                        default=final_3.PDF_BACKEND)
+    parser.add_argument("--max-pages", type=int, default=final_3.MAX_PDF_PAGES, help="0 reads every page")
+    parser.add_argument("--ner-window", type=int, default=final_3.NER_WINDOW_LINES,
+                        help="lines of each CV given to NER, 0 for the whole text")
+
+
+def build_parser():
+    # Shared options live on each subcommand so they can follow it.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-q", "--quiet", action="store_true", help="drop progress messages and warnings")
+    common.add_argument("--stats-report", help="write per-stage timings as JSON to this file")
+    common.add_argument("--profiler", choices=("cprofile", "pyinstrument"))
+    common.add_argument("--profile-output", help="where the profiler writes its dump")
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="CV screening and video resume analysis.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    screen = commands.add_parser("screen", parents=[common], help="analyze every CV in a folder")
+    add_folder_options(screen)
+    # No default: a .parquet or .arrow --output picks its own format.
+    add_output_options(screen, default_format=None, formats=("jsonl", "json", "csv", "text", "parquet", "arrow"))
+    screen.add_argument("--ranking", help="with --output, also rank every result into this file "
+                                                 "(.jsonl, .parquet or .arrow)")
+    screen.add_argument("-k", "--top-k", type=positive_int, help="rows in --ranking")
+    screen.add_argument("--restart", action="store_true",
+                        help="overwrite --output instead of reusing its results for unchanged files "
+                             "(jsonl, parquet, arrow)")
+    screen.add_argument("--checkpoint-every", type=int, default=result_sinks.CHECKPOINT_EVERY,
+                        help="records between fsyncs, or per Parquet/Arrow part file")
+    screen.set_defaults(run=run_screen)
+
+    rank = commands.add_parser("rank", parents=[common], help="rank the CVs in a folder, or earlier screen results")
+    add_folder_options(rank, folder_required=False)
+    rank.add_argument("--results", help="screen output (jsonl or json) to rank instead of a folder")
+    rank.add_argument("-k", "--top-k", type=positive_int)
+    add_output_options(rank)
+    rank.set_defaults(run=run_rank)
+
+    video = commands.add_parser("video", parents=[common],
+                                help="analyze a video resume, or a folder or manifest of them")
+    video.add_argument("source", help="video file, folder of videos, or manifest with one path per line")
+    video.add_argument("--backend", default="google", help="speech recognizer (google, sphinx, vosk, whisper, "
+                                                           "faster_whisper)")
+    video.add_argument("--sample-every", type=float, default=0.5, help="seconds between sampled frames")
+    video.add_argument("--batch-size", type=int, default=32)
+    video.add_argument("--chunk-seconds", type=float, default=30)
+    video.add_argument("--detector", choices=("haar", "dnn"), default="haar")
+    video.add_argument("--detect-max-width", type=int)
+    video.add_argument("--detect-every", type=int, default=1,
+                       help="run face detection every Nth sampled frame and track in between (single video)")
+    video.add_argument("--transcript", help="also write the transcript to this file (single video)")
+    add_output_options(video)
+    video.set_defaults(run=run_video)
+
+    bench = commands.add_parser("benchmark", parents=[common], help="throughput and latency on a synthetic corpus")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    bench.add_argument("--corpus-format", choices=("txt", "pdf"), default="txt")
+    bench.add_argument("--pages", type=int, default=1)
+    bench.add_argument("--skill-density", type=float, default=0.2)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("-w", "--workers", type=int, default=1)
+    bench.add_argument("--sample", type=int, default=1000)
+    bench.add_argument("--work-dir")
+    bench.add_argument("--keep", action="store_true")
+    add_output_options(bench, default_format="json")
+    bench.set_defaults(run=run_benchmark)
+
+    serve = commands.add_parser("serve", parents=[common],
+                                help="keep the models loaded and answer CV, rank and video jobs over HTTP")
+    serve.add_argument("--host", default=service.DEFAULT_HOST)
+    serve.add_argument("--port", type=int, default=service.DEFAULT_PORT)
+    serve.add_argument("--socket", help="listen on this Unix socket instead of host:port")
+    serve.add_argument("--max-batch", type=int, default=service.MAX_BATCH, help="most CVs per nlp.pipe batch")
+    serve.add_argument("--max-wait-ms", type=float, default=0,
+                       help="how long a batch waits for more CVs (0 runs whatever is queued)")
+    serve.add_argument("--max-queue", type=int, default=service.MAX_QUEUE)
+    serve.add_argument("--video-workers", type=int, default=1)
+    serve.add_argument("--no-video", action="store_true", help="skip loading the video models")
+    serve.add_argument("--cache-dir", default=pdf_cache.DEFAULT_CACHE_DIR, help="PDF text cache")
+    serve.add_argument("--no-cache", action="store_true")
+    serve.add_argument("--ocr", action="store_true", help="OCR scanned PDF pages")
+    serve.add_argument("--pdf-backend", choices=("auto", "pymupdf", "pypdf", "pdfplumber"),
+                       default=final_3.PDF_BACKEND)
+    serve.add_argument("--max-pages", type=int, default=final_3.MAX_PDF_PAGES, help="0 reads every page")
+    serve.add_argument("--ner-window", type=int, default=final_3.NER_WINDOW_LINES)
+    serve.add_argument("--log-requests", action="store_true")
+    serve.set_defaults(run=run_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Results go to the real stdout; the pipeline's own prints are moved to
+    # stderr (or dropped with --quiet) so they never mix with them.
+    args.stdout = sys.stdout
+    chatter = open(os.devnull, "w") if args.quiet else sys.stderr
+    if args.stats_report or args.profiler:
+        profiling.enable(args.profiler)
+    try:
+        with contextlib.redirect_stdout(chatter):
+            return args.run(args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"{args.command} failed: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if profiling.is_enabled():
+            profiling.disable(args.stats_report, args.profile_output)
+        if chatter is not sys.stderr:
+            chatter.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import re
+
+import profiling
+
+# A "Name:" label further down is usually a referee or a project field, so
+# only the first lines of the CV are trusted for it.
+HEADER_LINES = 10
+
+# Each field may start after anything that cannot be part of it: icons,
+# bullets, quotes, "Mob-", "Tel/" and the like all stay in front of it.
+EMAIL = r"(?<![\w.%+-])(?P<email>[\w.%+-]+@[\w.-]+\.[a-zA-Z]{2,})"
+URL = r"(?<![\w.-])(?P<url>(?:https?://|www\.|(?:linkedin|github)\.com/)[^\s<>\"']+)"
+# Plain runs of digits as before, plus +91 98765 43210, (555) 123-4567,
+# 555.123.4567 and similar; the digit count is checked after matching.
+# The group widths cap a candidate at 32 digits, and split_phones takes
+# apart a candidate that turns out to be several numbers side by side.
+PHONE = r"(?<![\w@+])(?P<phone>(?:\+\d{1,3}[ .\-]?)?(?:\(\d{2,4}\)[ .\-]?)?\d{2,5}(?:[ .\-]?\d{2,5}){0,4}(?![\w@]))"
+# The value is captured in a lookahead so an email or phone on the same
+# line is still found by the scan.
+NAME_LABEL = r"(?P<label>^[ \t]*(?i:name)\b[ \t]*[:\-]?\s*(?=(?P<name>[^\n]+)))"
+
+# At each position the alternatives are tried in order, so digits inside an
+# email or a link are not read as a phone.
+CONTACT_PATTERN = re.compile("|".join((EMAIL, URL, PHONE, NAME_LABEL)), re.MULTILINE)
+DIGIT_GROUPS = re.compile(r"\d+")
+
+PHONE_DIGITS = (10, 13)
+URL_TRAILING = ".,;:)]}"
+
+
+def header_end(text, lines=HEADER_LINES):
+    end = -1
+    for _ in range(lines):
+        end = text.find("\n", end + 1)
+        if end == -1:
+            return len(text)
+    return end
+
+
+def is_phone(candidate):
+    groups = DIGIT_GROUPS.findall(candidate)
+    digits = sum(len(group) for group in groups)
+    if not PHONE_DIGITS[0] <= digits <= PHONE_DIGITS[1]:
+        return False
+    # "2019 2022 2023" and the like are year ranges, not numbers.
+    return not all(len(group) == 4 and group[:2] in ("19", "20") for group in groups)
+
+
+def split_phones(candidate):
+    # A run is_phone rejects can still hold numbers: two side by side, or
+    # one after a PIN code or a year. The longest valid run of digit groups
+    # is taken from the right, since codes and years come before a number.
+    groups = list(DIGIT_GROUPS.finditer(candidate))
+    phones = []
+    end = len(groups)
+    while end:
+        for start in range(end):
+            begin = 0
+            if start:
+                begin = groups[start].start()
+                if candidate[begin - 1] == "(":
+                    begin -= 1
+            phone = candidate[begin:groups[end - 1].end()]
+            if is_phone(phone):
+                phones.append(phone)
+                end = start
+                break
+        else:
+            end -= 1
+    return phones[::-1]
+
+
+@profiling.timed("cv.contacts")
+def scan_contacts(text):
+    # One pass over the text for every contact field.
+    emails = []
+    phones = []
+    urls = []
+    name = None
+    header = header_end(text)
+    for match in CONTACT_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == "email":
+            emails.append(match.group("email"))
+        elif kind == "url":
+            urls.append(match.group("url").rstrip(URL_TRAILING))
+        elif kind == "phone":
+            if is_phone(match.group("phone")):
+                phones.append(match.group("phone"))
+            else:
+                phones.extend(split_phones(match.group("phone")))
+        elif name is None and match.start() < header:
+            name = match.group("name").strip()
+    return {"name": name, "emails": emails, "phones": phones, "urls": urls}
+
+
+# Contacts glued to icons, bullets or labels, as CV templates lay them out.
+REGRESSION_CASES = (
+    ("\u2022john@x.com", "emails", ["john@x.com"]),
+    ("\u2709john@x.com", "emails", ["john@x.com"]),
+    ("Email/john@x.com", "emails", ["john@x.com"]),
+    ('"john@x.com"', "emails", ["john@x.com"]),
+    ("Mob-9876543210", "phones", ["9876543210"]),
+    ("Tel/9876543210", "phones", ["9876543210"]),
+    ("\u260e9876543210", "phones", ["9876543210"]),
+    ("Mobile\u20139876543210", "phones", ["9876543210"]),
+    ("9876543210/9123456789", "phones", ["9876543210", "9123456789"]),
+    ("john.doe99@x.com +91 98765 43210", "phones", ["+91 98765 43210"]),
+    ("2019 2022 2023", "phones", []),
+    # Numbers next to other numbers, found by splitting the rejected run.
+    ("Ph: 9876543210 9123456789", "phones", ["9876543210", "9123456789"]),
+    ("Mumbai 400001 9876543210", "phones", ["9876543210"]),
+    ("B.Tech 2019 9876543210", "phones", ["9876543210"]),
+    ("Mumbai 400001 98765 43210", "phones", ["98765 43210"]),
+    ("+91 98765 43210 2019", "phones", ["+91 98765 43210"]),
+)
+
+
+if __name__ == "__main__":
+    failed = 0
+    for text, field, expected in REGRESSION_CASES:
+        found = scan_contacts(text)[field]
+        if found != expected:
+            failed += 1
+            print(f"FAIL {text!r}: {field} {found} != {expected}")
+    print(f"{len(REGRESSION_CASES) - failed}/{len(REGRESSION_CASES)} contact cases pass")
+    raise SystemExit(1 if failed else 0)
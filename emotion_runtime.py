@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+INPUT_SHAPE = (48, 48, 1)
+
+
+class OnnxEmotionModel:
+    # ONNX Runtime session with the slice of the Keras API predict_emotions
+    # uses, so recognize_emotions runs unchanged without importing TensorFlow.
+
+    def __init__(self, onnx_path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.path = onnx_path
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        batch_size = batch_size or len(batch)
+        outputs = [self.session.run(None, {self.input_name: batch[i:i + batch_size]})[0]
+                   for i in range(0, len(batch), batch_size)]
+        return np.concatenate(outputs) if outputs else np.zeros((0, 7), dtype=np.float32)
+
+
+def export_onnx(keras_model, onnx_path, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=opset, output_path=onnx_path)
+    return onnx_path
+
+
+def quantize_onnx(onnx_path, quantized_path):
+    # Dynamic int8 quantization of the weights, activations stay float.
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def compare_models(reference, candidate, faces=None, samples=256, seed=0):
+    # faces: 48x48 grayscale crops in 0-255. Real crops from a video are a
+    # better check than the random fallback.
+    if faces is None:
+        rng = np.random.default_rng(seed)
+        faces = rng.integers(0, 256, size=(samples,) + INPUT_SHAPE[:2], dtype=np.uint8)
+    batch = np.asarray(faces, dtype=np.float32).reshape((-1,) + INPUT_SHAPE) / 255.0
+    expected = reference.predict(batch, batch_size=64, verbose=0)
+    actual = candidate.predict(batch, batch_size=64, verbose=0)
+    return {
+        "samples": len(batch),
+        "label_agreement": float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1))),
+        "max_abs_diff": float(np.max(np.abs(expected - actual))),
+        "mean_abs_diff": float(np.mean(np.abs(expected - actual)))
+    }
+
+
+def export_and_check(keras_model, onnx_path, quantize=False, faces=None, min_agreement=0.98):
+    # The exported file is only kept if its predictions still agree with the
+    # Keras model, otherwise it is removed so the loader falls back to Keras.
+    float_path = onnx_path if not quantize else os.path.splitext(onnx_path)[0] + ".float.onnx"
+    export_onnx(keras_model, float_path)
+    if quantize:
+        quantize_onnx(float_path, onnx_path)
+        os.remove(float_path)
+
+    report = compare_models(keras_model, OnnxEmotionModel(onnx_path), faces)
+    report["path"] = onnx_path
+    report["quantized"] = quantize
+    report["accepted"] = report["label_agreement"] >= min_agreement
+    if not report["accepted"]:
+        os.remove(onnx_path)
+    return report
@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+
+def _downscale(gray, max_width):
+    height, width = gray.shape[:2]
+    if not max_width or width <= max_width:
+        return gray, 1.0
+    factor = max_width / width
+    return cv2.resize(gray, (max_width, int(height * factor)), interpolation=cv2.INTER_AREA), factor
+
+
+def _upscale_boxes(boxes, factor):
+    if factor == 1.0:
+        return [tuple(int(v) for v in box) for box in boxes]
+    return [tuple(int(round(v / factor)) for v in box) for box in boxes]
+
+
+class HaarDetector:
+    # The original cascade. With max_width set, detection runs on a smaller
+    # copy of the frame and boxes are mapped back to full resolution.
+
+    def __init__(self, cascade, max_width=None, scale_factor=1.3, min_neighbors=5):
+        self.cascade = cascade
+        self.max_width = max_width
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, gray):
+        small, factor = _downscale(gray, self.max_width)
+        boxes = self.cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors)
+        return _upscale_boxes(boxes, factor)
+
+
+class DnnDetector:
+    # OpenCV's ResNet-10 SSD face detector on the CPU. It always sees a
+    # 300x300 input, so its cost does not grow with the video resolution.
+
+    def __init__(self, net, confidence=0.5, input_size=300):
+        self.net = net
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, gray):
+        height, width = gray.shape[:2]
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (self.input_size, self.input_size)), 1.0,
+                                     (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        boxes = []
+        for detection in detections[detections[:, 2] >= self.confidence]:
+            x0, y0, x1, y1 = (detection[3:7] * np.array([width, height, width, height])).astype(int)
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(width, x1), min(height, y1)
+            if x1 > x0 and y1 > y0:
+                boxes.append((int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+        return boxes
+
+
+class TrackingDetector:
+    # Runs the wrapped detector every detect_every frames and follows the
+    # last boxes with template matching in a small window in between.
+
+    def __init__(self, detector, detect_every=5, search_margin=0.5, min_score=0.6):
+        self.detector = detector
+        self.detect_every = max(1, detect_every)
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.frame_index = 0
+        self.tracks = []
+
+    def _track(self, gray):
+        frame_height, frame_width = gray.shape[:2]
+        boxes = []
+        for (x, y, w, h), template in self.tracks:
+            margin_x, margin_y = int(w * self.search_margin), int(h * self.search_margin)
+            x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+            x1, y1 = min(frame_width, x + w + margin_x), min(frame_height, y + h + margin_y)
+            region = gray[y0:y1, x0:x1]
+            if region.shape[0] < h or region.shape[1] < w:
+                continue
+            _, score, _, (best_x, best_y) = cv2.minMaxLoc(cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED))
+            if score >= self.min_score:
+                boxes.append((x0 + best_x, y0 + best_y, w, h))
+        return boxes
+
+    def detect(self, gray):
+        if self.frame_index % self.detect_every == 0 or not self.tracks:
+            boxes = self.detector.detect(gray)
+        else:
+            boxes = self._track(gray)
+        self.tracks = [((x, y, w, h), gray[y:y + h, x:x + w].copy()) for (x, y, w, h) in boxes]
+        self.frame_index += 1
+        return boxes
@@ -1,28 +1,118 @@
 import os
-import re
-import moviepy as mp
-import speech_recognition as sr
-import spacy
-import pdfplumber
+import importlib.metadata
+import time
 import cv2
 import numpy as np
-from collections import Counter
-from keras.models import model_from_json
-from nltk.sentiment import SentimentIntensityAnalyzer
-import nltk
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
+import analysis_index
+import emotion_runtime
+import face_detectors
+import model_registry
+import ocr
+import pdf_backends
+import pdf_cache
+import profiling
+import ranking
+import transcription
+import video_demux
+from contacts import header_end, scan_contacts
+from skill_matcher import get_skill_matcher, normalize_text
+
+SPACY_MODEL = "en_core_web_sm"
+# NER only looks for the candidate's name, which sits at the top of a CV, so
+# spaCy sees just this many lines (capped in characters for PDFs whose text
+# has few line breaks). None runs NER over the whole document.
+NER_WINDOW_LINES = 10
+NER_WINDOW_CHARS = 1000
+EMOTION_MODEL_JSON = r"D:\Study Stuff\Sem 5\Mini Project\spaCy\emotion recognition\emotiondetector.json"
+EMOTION_MODEL_WEIGHTS = r"D:\Study Stuff\Sem 5\Mini Project\spaCy\emotion recognition\emotiondetector.h5"
+# Written by export_emotion_model, used instead of Keras when present.
+EMOTION_MODEL_ONNX = os.path.splitext(EMOTION_MODEL_WEIGHTS)[0] + ".onnx"
+# OpenCV's res10 SSD face detector, used by the "dnn" face detector backend.
+# Not shipped with the repo, download deploy.prototxt and
+# res10_300x300_ssd_iter_140000.caffemodel into "emotion recognition".
+FACE_DNN_PROTOTXT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion recognition", "deploy.prototxt")
+FACE_DNN_WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion recognition",
+                                "res10_300x300_ssd_iter_140000.caffemodel")
+EMOTION_LABELS = {0: 'angry', 1: 'disgust', 2: 'fear', 3: 'happy', 4: 'neutral', 5: 'sad', 6: 'surprise'}
+
+# "auto" tries PyMuPDF first and falls back to pypdf and pdfplumber only
+# when the text comes back empty or garbled.
+PDF_BACKEND = "auto"
+# Pages past this are not read; a CV's content is in its first few pages
+# and anything beyond is usually an attached portfolio. None reads all.
+MAX_PDF_PAGES = 20
+
+
+# Models are loaded on first use instead of at import, so the resume-only
+# path never pays for TensorFlow, the Haar cascade or the VADER download.
+def load_nlp():
+    import spacy
+    return spacy.load(SPACY_MODEL)
+
+
+def load_keras_emotion_model():
+    from keras.models import model_from_json
+    with open(EMOTION_MODEL_JSON, "r") as json_file:
+        model = model_from_json(json_file.read())
+    model.load_weights(EMOTION_MODEL_WEIGHTS)
+    return model
+
+
+def load_emotion_model():
+    # The ONNX export skips importing TensorFlow altogether.
+    if os.path.exists(EMOTION_MODEL_ONNX):
+        try:
+            return emotion_runtime.OnnxEmotionModel(EMOTION_MODEL_ONNX)
+        except ImportError:
+            print("Warning: onnxruntime is not installed, using the Keras emotion model.")
+    return load_keras_emotion_model()
+
+
+def export_emotion_model(quantize=False, faces=None, min_agreement=0.98):
+    report = emotion_runtime.export_and_check(load_keras_emotion_model(), EMOTION_MODEL_ONNX, quantize,
+                                              faces, min_agreement)
+    if report["accepted"]:
+        model_registry.unload("emotion_model")
+    else:
+        print(f"Warning: exported model agrees on only {report['label_agreement']:.1%} of labels, not used.")
+    return report
+
+
+def load_face_cascade():
+    haar_file = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    return cv2.CascadeClassifier(haar_file)
+
+
+def load_face_dnn():
+    return cv2.dnn.readNetFromCaffe(FACE_DNN_PROTOTXT, FACE_DNN_WEIGHTS)
+
+
+def load_sentiment_analyzer():
+    import nltk
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    try:
+        return SentimentIntensityAnalyzer()
+    except LookupError:
+        nltk.download('vader_lexicon', quiet=True)
+        return SentimentIntensityAnalyzer()
+
+
+model_registry.register("nlp", load_nlp)
+model_registry.register("emotion_model", load_emotion_model)
+model_registry.register("face_cascade", load_face_cascade)
+model_registry.register("face_dnn", load_face_dnn)
+model_registry.register("sia", load_sentiment_analyzer)
+
+CV_MODELS = ("nlp",)
+VIDEO_MODELS = ("emotion_model", "face_cascade", "sia")
 
-nltk.download('vader_lexicon')
-sia = SentimentIntensityAnalyzer()
-nlp = spacy.load("en_core_web_sm")
 
-# Load emotion recognition model
-json_file = open(r"D:\Study Stuff\Sem 5\Mini Project\spaCy\emotion recognition\emotiondetector.json", "r")
-model_json = json_file.read()
-json_file.close()
-model = model_from_json(model_json)
-model.load_weights(r"D:\Study Stuff\Sem 5\Mini Project\spaCy\emotion recognition\emotiondetector.h5")
-haar_file = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-face_cascade = cv2.CascadeClassifier(haar_file)
+def warm_up_models(*names):
+    model_registry.warm_up(*names)
 
 
 def extract_features(image):
@@ -31,16 +121,38 @@ def extract_features(image):
     return feature / 255.0
 
 
-def extract_name(cv_text, doc):
-    name_pattern = re.search(r"Name[:\-]?\s*(.+)", cv_text, re.IGNORECASE)
-    if name_pattern:
-        return name_pattern.group(1).strip()
+def name_without_ner(cv_text, scanned=None):
+    # scanned: scan_contacts(cv_text), when the caller already has it.
+    labeled_name = (scanned or scan_contacts(cv_text))["name"]
+    if labeled_name:
+        return labeled_name
 
     lines = cv_text.splitlines()
     if lines:
         first_line = lines[0]
         if all(word.isalpha() or word == '.' for word in first_line.split()):
             return first_line.strip()
+    return None
+
+
+def name_window(cv_text, lines=NER_WINDOW_LINES):
+    if lines is None:
+        return cv_text
+    return cv_text[:min(header_end(cv_text, lines), NER_WINDOW_CHARS)]
+
+
+def ner_input(cv_text, scanned, window=NER_WINDOW_LINES):
+    # What spaCy has to read for this CV: nothing when the name is already
+    # known without NER, otherwise only the header window.
+    if name_without_ner(cv_text, scanned):
+        return ""
+    return name_window(cv_text, window)
+
+
+def extract_name(cv_text, doc, scanned=None):
+    name = name_without_ner(cv_text, scanned)
+    if name:
+        return name
 
     for ent in doc.ents:
         if ent.label_ == "PERSON":
@@ -50,189 +162,705 @@ def extract_name(cv_text, doc):
     return "Name not found"
 
 
-def extract_email(text):
-    email_regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-    emails = re.findall(email_regex, text)
+def extract_email(text, scanned=None):
+    emails = (scanned or scan_contacts(text))["emails"]
     return emails if emails else ["Email not found"]
 
 
-def extract_phone(text):
-    phone_regex = r'\b\d{10,13}\b'
-    phones = re.findall(phone_regex, text)
+def extract_phone(text, scanned=None):
+    phones = (scanned or scan_contacts(text))["phones"]
     return phones if phones else ["Phone number not found"]
 
 
-def extract_skills(doc, skill_set):
-    found_skills = set()
-    for token in doc:
-        token_text = token.text.lower()
-        if token_text in skill_set:
-            found_skills.add(token_text)
-    return list(found_skills) if found_skills else ["No skills found"]
+def extract_links(text, scanned=None):
+    return (scanned or scan_contacts(text))["urls"]
 
 
-def analyze_cv(cv_text, user_skills):
-    doc = nlp(cv_text)
-    name = extract_name(cv_text, doc)
-    emails = extract_email(cv_text)
-    phones = extract_phone(cv_text)
-    skills = extract_skills(doc, user_skills)
+@profiling.timed("cv.skills")
+def extract_skills(cv_text, skill_set):
+    found_skills = get_skill_matcher(skill_set).find(cv_text)
+    return sorted(found_skills) if found_skills else ["No skills found"]
+
+
+def unused_pipes(nlp):
+    # Only extract_name reads the doc (its ents), so everything except ner
+    # (and a tok2vec that ner listens to) can be skipped.
+    needed = {"ner"}
+    if "tok2vec" in nlp.pipe_names and "ner" in getattr(nlp.get_pipe("tok2vec"), "listening_components", []):
+        needed.add("tok2vec")
+    return [name for name in nlp.pipe_names if name not in needed]
+
+
+def build_cv_result(cv_text, doc, user_skills, scanned=None):
+    scanned = scanned or scan_contacts(cv_text)
+    name = extract_name(cv_text, doc, scanned)
+    emails = extract_email(cv_text, scanned)
+    phones = extract_phone(cv_text, scanned)
+    links = extract_links(cv_text, scanned)
+    skills = extract_skills(cv_text, user_skills)
     return {
         "Name": name,
         "Emails": emails,
         "Phone Numbers": phones,
+        "Links": links,
         "Skills Found": skills
     }
 
 
-def extract_text_from_pdfs(folder_path):
-    pdf_text_data = {}
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.pdf'):
+def build_cv_profile(cv_text, doc, scanned=None):
+    # Everything analyze_cv needs except the skill set, so the analysis index
+    # can re-match skills later without running spaCy again.
+    scanned = scanned or scan_contacts(cv_text)
+    return {
+        "Name": extract_name(cv_text, doc, scanned),
+        "Emails": extract_email(cv_text, scanned),
+        "Phone Numbers": extract_phone(cv_text, scanned),
+        "Links": extract_links(cv_text, scanned),
+        "Text": normalize_text(cv_text)
+    }
+
+
+@profiling.timed("cv.skills")
+def skills_from_profile(profile, skill_set):
+    found_skills = get_skill_matcher(skill_set).find(profile["Text"], normalized=True)
+    return sorted(found_skills) if found_skills else ["No skills found"]
+
+
+def analysis_version(ner_window=NER_WINDOW_LINES):
+    # Read from package metadata so checking the index never loads spaCy.
+    try:
+        model_version = importlib.metadata.version(SPACY_MODEL)
+    except importlib.metadata.PackageNotFoundError:
+        model_version = "unknown"
+    return f"{SPACY_MODEL}-{model_version}-3-n{ner_window}"
+
+
+@profiling.timed("cv.analyze")
+def analyze_cv(cv_text, user_skills, ner_window=NER_WINDOW_LINES):
+    nlp = model_registry.get("nlp")
+    scanned = scan_contacts(cv_text)
+    with profiling.stage("cv.ner"):
+        doc = nlp(ner_input(cv_text, scanned, ner_window), disable=unused_pipes(nlp))
+    return build_cv_result(cv_text, doc, user_skills, scanned)
+
+
+def ner_docs(cv_texts, batch_size, n_process, ner_window):
+    # Yields (cv_text, doc, scanned); the docs cover only what ner_input
+    # keeps, the full text travels alongside as the pipe context.
+    nlp = model_registry.get("nlp")
+
+    def inputs():
+        for cv_text in cv_texts:
+            scanned = scan_contacts(cv_text)
+            yield ner_input(cv_text, scanned, ner_window), (cv_text, scanned)
+
+    docs = nlp.pipe(inputs(), as_tuples=True, batch_size=batch_size, n_process=n_process, disable=unused_pipes(nlp))
+    for doc, (cv_text, scanned) in profiling.iter_stage("cv.ner", docs):
+        profiling.count("cv.documents")
+        yield cv_text, doc, scanned
+
+
+def analyze_cvs(cv_texts, user_skills, batch_size=64, n_process=1, ner_window=NER_WINDOW_LINES):
+    for cv_text, doc, scanned in ner_docs(cv_texts, batch_size, n_process, ner_window):
+        yield build_cv_result(cv_text, doc, user_skills, scanned)
+
+
+def profile_cvs(cv_texts, batch_size=64, n_process=1, ner_window=NER_WINDOW_LINES):
+    for cv_text, doc, scanned in ner_docs(cv_texts, batch_size, n_process, ner_window):
+        yield build_cv_profile(cv_text, doc, scanned)
+
+
+def iter_pdf_pages(pdf_path, backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES, ocr_workers=0, ocr_cache_dir=None):
+    # Pages come out as they are parsed. Scanned pages have no text layer;
+    # a run of them is held back and OCR-ed together so the run's pages can
+    # go to the pool at once, then the stream continues in page order.
+    textless = []
+    for page in profiling.iter_stage("pdf.parse", pdf_backends.iter_pages(pdf_path, backend, max_pages)):
+        profiling.count("pdf.pages")
+        if ocr_workers and not page["text"].strip():
+            textless.append(page)
+            continue
+        yield from _ocr_pages(pdf_path, textless, ocr_workers, ocr_cache_dir)
+        textless = []
+        yield page
+    yield from _ocr_pages(pdf_path, textless, ocr_workers, ocr_cache_dir)
+
+
+def _ocr_pages(pdf_path, pages, ocr_workers, ocr_cache_dir):
+    if not pages:
+        return
+    with profiling.stage("pdf.ocr"):
+        texts = ocr.ocr_pdf_pages(pdf_path, [page["page"] for page in pages], workers=ocr_workers,
+                                  cache_dir=ocr_cache_dir)
+    profiling.count("pdf.ocr_pages", len(pages))
+    for page in pages:
+        page["text"] = texts[page["page"]]
+        page["chars"] = len(page["text"])
+        page["ocr"] = True
+        yield page
+
+
+def extract_pdf_pages(pdf_path, backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES, ocr_workers=0, ocr_cache_dir=None):
+    return list(iter_pdf_pages(pdf_path, backend, max_pages, ocr_workers, ocr_cache_dir))
+
+
+def _check_ocr(ocr_workers):
+    if ocr_workers and not ocr.available():
+        print("Warning: OCR needs PyMuPDF and tesserocr or pytesseract, scanned pages stay empty.")
+        return 0
+    return ocr_workers
+
+
+def _cached_pdf_entry(pdf_path, cache_dir, backend, max_pages, ocr_workers):
+    version = pdf_backends.extractor_version(backend, max_pages)
+    if ocr_workers:
+        version = f"{version}+{ocr.OCR_VERSION}"
+    extract_pages = partial(extract_pdf_pages, backend=backend, max_pages=max_pages, ocr_workers=ocr_workers,
+                            ocr_cache_dir=cache_dir)
+    return pdf_cache.load_or_extract(cache_dir, pdf_path, version, extract_pages)
+
+
+@profiling.timed("pdf.text")
+def extract_text_from_pdf(pdf_path, cache_dir=None, ocr_workers=0, backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES):
+    file_name = os.path.basename(pdf_path)
+    ocr_workers = _check_ocr(ocr_workers)
+    if cache_dir:
+        entry = _cached_pdf_entry(pdf_path, cache_dir, backend, max_pages, ocr_workers)
+    else:
+        entry = pdf_cache.make_entry(extract_pdf_pages(pdf_path, backend, max_pages, ocr_workers))
+
+    for page in entry["pages"]:
+        if not page["chars"]:
+            print(f"Warning: No text extracted from a page in {file_name}")
+    text = entry["text"]
+    if not text.strip():
+        print(f"Warning: {file_name} has no extractable text.")
+    return text
+
+
+def stream_pdf_pages(folder_path, cache_dir=None, backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES, ocr_workers=0):
+    # Yields (file_name, page_no, text) one page at a time, so memory stays
+    # at one document however large the folder is.
+    with ocr.shared_pool(_check_ocr(ocr_workers)) as ocr_workers:
+        for file_name in sorted(os.listdir(folder_path)):
+            if not file_name.endswith('.pdf'):
+                continue
             pdf_path = os.path.join(folder_path, file_name)
             try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    text = ""
-                    for page in pdf.pages:
-                        extracted_text = page.extract_text()
-                        if extracted_text:
-                            text += extracted_text
-                        else:
-                            print(f"Warning: No text extracted from a page in {file_name}")
-                    if not text.strip():
-                        print(f"Warning: {file_name} has no extractable text.")
-                    pdf_text_data[file_name] = text
+                if cache_dir:
+                    # A cached entry keeps the pages' text joined; each page's
+                    # "chars" is its length, which is enough to split it again.
+                    entry = _cached_pdf_entry(pdf_path, cache_dir, backend, max_pages, ocr_workers)
+                    offset = 0
+                    for page in entry["pages"]:
+                        yield file_name, page["page"], entry["text"][offset:offset + page["chars"]]
+                        offset += page["chars"]
+                else:
+                    for page in iter_pdf_pages(pdf_path, backend, max_pages, ocr_workers):
+                        yield file_name, page["page"], page["text"]
             except Exception as e:
                 print(f"Error reading {file_name}: {e}")
-    return pdf_text_data
 
 
-def process_folder(folder_path, user_skills):
-    results = {}
-    processed_files = set()
+@profiling.timed("pdf.folder")
+def extract_text_from_pdfs(folder_path, cache_dir=None, backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES):
+    pdf_text_data = {}
+    for file_name, _, text in stream_pdf_pages(folder_path, cache_dir, backend, max_pages):
+        pdf_text_data.setdefault(file_name, []).append(text)
+    if cache_dir:
+        pdf_cache.prune_cache(cache_dir)
+    return {file_name: "".join(texts) for file_name, texts in pdf_text_data.items()}
+
+
+def list_cv_files(folder_path):
+    # A .txt next to a PDF of the same name is the side file written by an
+    # earlier run, so only the PDF is analyzed.
+    file_names = sorted(os.listdir(folder_path))
+    pdf_names = {os.path.splitext(f)[0] for f in file_names if f.endswith(".pdf")}
+    cv_files = []
+    for file_name in file_names:
+        base_name, ext = os.path.splitext(file_name)
+        if ext == ".pdf" or (ext == ".txt" and base_name not in pdf_names):
+            cv_files.append(file_name)
+    return cv_files
+
+
+@profiling.timed("cv.load")
+def load_cv_text(folder_path, file_name, cache_dir=None, ocr_workers=0, pdf_backend=PDF_BACKEND,
+                 max_pages=MAX_PDF_PAGES):
+    file_path = os.path.join(folder_path, file_name)
+    try:
+        if file_name.endswith(".pdf"):
+            return extract_text_from_pdf(file_path, cache_dir, ocr_workers, pdf_backend, max_pages)
+        with open(file_path, "r", encoding="utf-8") as file:
+            return file.read()
+    except Exception as e:
+        print(f"Error reading {file_name}: {e}")
+        return None
+
+
+def analyze_cv_files(folder_path, file_names, analyze, load_text=load_cv_text):
+    # Files are read as the analyzer pulls texts, and each result is yielded
+    # as soon as it comes out, so the first CVs are analyzed while later ones
+    # are still being extracted.
+    loaded = deque()
+
+    def texts():
+        for file_name in file_names:
+            content = load_text(folder_path, file_name)
+            if content is not None and not content.strip():
+                print(f"Skipped analysis for {file_name} due to empty content.")
+            loaded.append((file_name, content))
+            if content and content.strip():
+                yield content
+
+    for result in analyze(texts()):
+        while not (loaded[0][1] and loaded[0][1].strip()):
+            yield loaded.popleft() + (None,)
+        yield loaded.popleft() + (result,)
+    while loaded:
+        yield loaded.popleft() + (None,)
+
+
+def init_cv_worker(collect_stats=False):
+    # A forked worker starts with a copy of the parent's stage timings; it
+    # starts over so only its own work is sent back with each chunk.
+    if collect_stats:
+        profiling.enable()
+    else:
+        profiling.disable()
+    warm_up_models(*CV_MODELS)
+
+
+def analyze_cv_chunk(folder_path, file_names, analyze, load_text=load_cv_text):
+    analyzed = list(analyze_cv_files(folder_path, file_names, analyze, load_text))
+    return analyzed, profiling.drain()
+
+
+def map_cv_files(folder_path, cv_files, analyze, workers=1, batch_size=64, cache_dir=None, use_ocr=False,
+                 pdf_backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES):
+    if workers and workers > 1 and len(cv_files) > 1:
+        # Each worker loads spaCy once when it starts and keeps it for every
+        # batch it is handed, so the cost is paid per process. The files are
+        # already spread over the pool, so each one OCRs its pages serially.
+        load_text = partial(load_cv_text, cache_dir=cache_dir, ocr_workers=1 if use_ocr else 0,
+                            pdf_backend=pdf_backend, max_pages=max_pages)
+        chunk_len = max(1, min(batch_size, len(cv_files) // (workers * 4)))
+        chunks = [cv_files[i:i + chunk_len] for i in range(0, len(cv_files), chunk_len)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_cv_worker,
+                                 initargs=(profiling.is_enabled(),)) as executor:
+            for analyzed, stats in executor.map(analyze_cv_chunk, repeat(folder_path), chunks, repeat(analyze),
+                                                repeat(load_text)):
+                profiling.merge(stats)
+                yield from analyzed
+    else:
+        # One OCR pool serves every scanned PDF in the run.
+        with ocr.shared_pool(_check_ocr((os.cpu_count() or 1) if use_ocr else 0)) as ocr_workers:
+            load_text = partial(load_cv_text, cache_dir=cache_dir, ocr_workers=ocr_workers, pdf_backend=pdf_backend,
+                                max_pages=max_pages)
+            yield from analyze_cv_files(folder_path, cv_files, analyze, load_text)
 
-    for file_name in os.listdir(folder_path):
-        base_name = os.path.splitext(file_name)[0]
-        if base_name in processed_files:
-            continue
-        processed_files.add(base_name)
-
-        if file_name.endswith(".txt"):
-            file_path = os.path.join(folder_path, file_name)
-            with open(file_path, "r", encoding="utf-8") as file:
-                cv_text = file.read()
-                if not cv_text.strip():
-                    print(f"Warning: {file_name} is empty.")
-                    continue
-                results[file_name] = analyze_cv(cv_text, user_skills)
 
-    pdf_text_data = extract_text_from_pdfs(folder_path)
-    for pdf_name, content in pdf_text_data.items():
-        txt_file_path = os.path.join(folder_path, f"{os.path.splitext(pdf_name)[0]}.txt")
+def write_side_file(folder_path, file_name, content):
+    if content is not None and file_name.endswith(".pdf"):
+        txt_file_path = os.path.join(folder_path, f"{os.path.splitext(file_name)[0]}.txt")
         with open(txt_file_path, "w", encoding="utf-8") as f:
             f.write(content)
-        if content.strip():
-            results[pdf_name] = analyze_cv(content, user_skills)
-        else:
-            print(f"Skipped analysis for {pdf_name} due to empty content.")
 
+
+def iter_folder_indexed(folder_path, user_skills, index_path, workers=1, batch_size=64, cache_dir=None,
+                        use_ocr=False, pdf_backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES, ner_window=NER_WINDOW_LINES,
+                        skip=()):
+    conn = analysis_index.open_index(index_path)
+    # A different backend, page cap or OCR setting reads different text from
+    # the same file, so profiles built from one are not reused for another.
+    version = f"{analysis_version(ner_window)}-{pdf_backends.extractor_version(pdf_backend, max_pages)}"
+    if use_ocr and ocr.available():
+        version = f"{version}+{ocr.OCR_VERSION}"
+    skills_key = analysis_index.skills_key(user_skills)
+    digests = {}
+    pending = []
+    try:
+        with conn:
+            for file_name in list_cv_files(folder_path):
+                if file_name in skip:
+                    continue
+                try:
+                    digest = analysis_index.indexed_digest(conn, os.path.join(folder_path, file_name))
+                except OSError as e:
+                    print(f"Error reading {file_name}: {e}")
+                    yield file_name, None
+                    continue
+                digests[file_name] = digest
+                if not (analysis_index.has_profile(conn, digest, version) or
+                        analysis_index.is_empty(conn, digest, version)):
+                    pending.append(file_name)
+
+        if pending:
+            print(f"Analyzing {len(pending)} new or changed CVs ({len(digests) - len(pending)} unchanged).")
+        analyze = partial(profile_cvs, batch_size=batch_size, ner_window=ner_window)
+        done = 0
+        for file_name, content, profile in map_cv_files(folder_path, pending, analyze, workers, batch_size,
+                                                        cache_dir, use_ocr, pdf_backend, max_pages):
+            write_side_file(folder_path, file_name, content)
+            if profile is not None:
+                analysis_index.put_profile(conn, digests[file_name], version, profile)
+            elif content is not None and not content.strip():
+                # Unreadable files (content None) are tried again next run.
+                analysis_index.put_empty(conn, digests[file_name], version)
+            done += 1
+            if done % batch_size == 0:
+                conn.commit()
+        conn.commit()
+
+        with conn:
+            for file_name, digest in digests.items():
+                skills = analysis_index.get_skills(conn, digest, version, skills_key)
+                profile = analysis_index.get_profile(conn, digest, version, with_text=skills is None)
+                if profile is None:
+                    yield file_name, None
+                    continue
+                if skills is None:
+                    skills = skills_from_profile(profile, user_skills)
+                    analysis_index.put_skills(conn, digest, version, skills_key, skills)
+                yield file_name, {
+                    "Name": profile["Name"],
+                    "Emails": profile["Emails"],
+                    "Phone Numbers": profile["Phone Numbers"],
+                    "Links": profile["Links"],
+                    "Skills Found": skills
+                }
+    finally:
+        conn.close()
+
+
+def process_folder_indexed(folder_path, user_skills, index_path, workers=1, batch_size=64, cache_dir=None,
+                           use_ocr=False, pdf_backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES,
+                           ner_window=NER_WINDOW_LINES):
+    return {file_name: result for file_name, result in iter_folder_indexed(
+        folder_path, user_skills, index_path, workers, batch_size, cache_dir, use_ocr, pdf_backend, max_pages,
+        ner_window) if result is not None}
+
+
+def iter_folder_results(folder_path, user_skills, workers=1, batch_size=64, cache_dir=None, index_path=None,
+                        use_ocr=False, pdf_backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES, ner_window=NER_WINDOW_LINES,
+                        skip=()):
+    # Yields (file_name, result) for every CV in the folder as soon as it is
+    # analyzed; result is None for files that were empty or unreadable.
+    # Files named in skip (e.g. done by an earlier, interrupted run) are left
+    # out.
+    if index_path:
+        yield from iter_folder_indexed(folder_path, user_skills, index_path, workers, batch_size, cache_dir,
+                                       use_ocr, pdf_backend, max_pages, ner_window, skip)
+        return
+    analyze = partial(analyze_cvs, user_skills=user_skills, batch_size=batch_size, ner_window=ner_window)
+    cv_files = [file_name for file_name in list_cv_files(folder_path) if file_name not in skip]
+    for file_name, content, result in map_cv_files(folder_path, cv_files, analyze, workers, batch_size, cache_dir,
+                                                   use_ocr, pdf_backend, max_pages):
+        write_side_file(folder_path, file_name, content)
+        yield file_name, result
+
+
+def process_folder(folder_path, user_skills, workers=1, batch_size=64, cache_dir=None,
+                   cache_max_bytes=pdf_cache.DEFAULT_MAX_BYTES, index_path=None, use_ocr=False,
+                   pdf_backend=PDF_BACKEND, max_pages=MAX_PDF_PAGES, ner_window=NER_WINDOW_LINES):
+    results = {}
+    for file_name, result in iter_folder_results(folder_path, user_skills, workers, batch_size, cache_dir,
+                                                 index_path, use_ocr, pdf_backend, max_pages, ner_window):
+        if result is not None:
+            results[file_name] = result
+
+    if cache_dir:
+        pdf_cache.prune_cache(cache_dir, cache_max_bytes)
     return results
 
 
 def calculate_score(result, required_skills):
-    score = 0
-    skills_found = set(result.get("Skills Found", []))
-    matching_skills = {req_skill for req_skill in required_skills if req_skill in skills_found}
-    score += len(matching_skills) * 10
-    if result.get("Name") and result["Name"] != "Name not found":
-        score += 5
-    if result.get("Emails") and result["Emails"][0] != "Email not found":
-        score += 5
-    if result.get("Phone Numbers") and result["Phone Numbers"][0] != "Phone number not found":
-        score += 5
-    return score
-
-
-def rank_resumes(analysis_results, required_skills):
-    resume_scores = {}
-    for file_name, result in analysis_results.items():
-        score = calculate_score(result, required_skills)
-        resume_scores[file_name] = score
-    ranked_resumes = sorted(resume_scores.items(), key=lambda x: x[1], reverse=True)
-    return ranked_resumes
-
-
-def recognize_emotions(video_file):
-    webcam = cv2.VideoCapture(video_file)
-    labels = {0: 'angry', 1: 'disgust', 2: 'fear', 3: 'happy', 4: 'neutral', 5: 'sad', 6: 'surprise'}
-    fps = int(webcam.get(cv2.CAP_PROP_FPS))
-    frame_skip = int(0.5 * fps)
-    emotions_detected = []
+    return ranking.score_result(result, required_skills)
+
+
+@profiling.timed("rank")
+def rank_resumes(analysis_results, required_skills, top_k=None):
+    if not analysis_results:
+        return []
+    matrix = ranking.build_skill_matrix(analysis_results)
+    return ranking.rank_candidates(matrix, [required_skills], top_k)[0]
 
-    frame_count = 0
-    while True:
-        ret, frame = webcam.read()
-        if not ret:
-            break
-
-        if frame_count % frame_skip == 0:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-            for (x, y, w, h) in faces:
-                face = gray[y:y + h, x:x + w]
-                face = cv2.resize(face, (48, 48))
-                features = extract_features(face)
-                predictions = model.predict(features, verbose=0)
-                predicted_label = labels[np.argmax(predictions)]
-                emotions_detected.append(predicted_label)
 
+def make_face_detector(backend="haar", max_width=None, detect_every=1):
+    # A new detector per video, the tracking wrapper keeps per-video state.
+    # The cascade and the dnn.Net are not safe to share between threads, so
+    # each thread detects with its own.
+    if backend == "haar":
+        detector = face_detectors.HaarDetector(model_registry.get_local("face_cascade"), max_width)
+    elif backend == "dnn":
+        detector = face_detectors.DnnDetector(model_registry.get_local("face_dnn"))
+    else:
+        raise ValueError(f"Unknown face detector backend: {backend}")
+    if detect_every > 1:
+        detector = face_detectors.TrackingDetector(detector, detect_every)
+    return detector
+
+
+@profiling.timed("video.predict")
+def predict_emotions(faces, batch_size=32):
+    # Pad to a fixed batch size so Keras reuses one compiled graph instead of
+    # retracing for every partial batch.
+    batch = np.stack(faces).reshape(-1, 48, 48, 1) / 255.0
+    if len(batch) < batch_size:
+        batch = np.concatenate([batch, np.zeros((batch_size - len(batch), 48, 48, 1))])
+    model = model_registry.get("emotion_model")
+    predictions = model.predict(batch, batch_size=batch_size, verbose=0)[:len(faces)]
+    return [EMOTION_LABELS[i] for i in np.argmax(predictions, axis=1)]
+
+
+def sample_frames(webcam, sample_every=0.5, seek=False):
+    # Yields (seconds, frame) roughly every sample_every seconds.
+    if seek:
+        # Jump straight to each sample time, nothing in between is decoded.
+        # Fastest for sparse sampling, accuracy depends on the container's
+        # keyframe spacing.
+        timestamp = 0.0
+        while True:
+            webcam.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+            ret, frame = webcam.read()
+            if not ret:
+                break
+            yield round(timestamp, 2), frame
+            timestamp += sample_every
+        return
+
+    # grab() advances without converting the frame to BGR, only sampled
+    # frames pay for retrieve().
+    fps = webcam.get(cv2.CAP_PROP_FPS)
+    frame_skip = max(1, round(sample_every * fps)) if fps and fps > 0 else 0
+    frame_count = 0
+    next_time = 0.0
+    while webcam.grab():
+        if frame_skip:
+            sampled = frame_count % frame_skip == 0
+            timestamp = frame_count / fps
+        else:
+            # Some containers report 0 FPS, fall back to the decoder clock.
+            timestamp = webcam.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            sampled = timestamp >= next_time
+            if sampled:
+                next_time = timestamp + sample_every
+        if sampled:
+            ret, frame = webcam.retrieve()
+            if not ret:
+                break
+            yield round(timestamp, 2), frame
         frame_count += 1
 
-    webcam.release()
 
+def emotions_from_frames(frames, batch_size=32, face_detector=None):
+    if face_detector is None:
+        face_detector = make_face_detector()
+    emotions_detected = []
+    emotion_timeline = []
+    pending_faces = []
+    pending_times = []
+
+    for timestamp, gray in profiling.iter_stage("video.decode", frames):
+        with profiling.stage("video.detect"):
+            faces = face_detector.detect(gray)
+        profiling.count("video.frames")
+        profiling.count("video.faces", len(faces))
+        for (x, y, w, h) in faces:
+            face = gray[y:y + h, x:x + w]
+            pending_faces.append(cv2.resize(face, (48, 48)))
+            pending_times.append(timestamp)
+
+        # Faces from several frames share one forward pass.
+        if len(pending_faces) >= batch_size:
+            labels = predict_emotions(pending_faces, batch_size)
+            emotions_detected.extend(labels)
+            emotion_timeline.extend(zip(pending_times, labels))
+            pending_faces = []
+            pending_times = []
+
+    if pending_faces:
+        labels = predict_emotions(pending_faces, batch_size)
+        emotions_detected.extend(labels)
+        emotion_timeline.extend(zip(pending_times, labels))
+
+    return emotions_detected, emotion_timeline
+
+
+def summarize_emotions(emotions_detected, emotion_timeline, verbose=True):
     emotion_counts = Counter(emotions_detected)
     detected_emotions = "\n".join([f"{emotion}: {count} occurrences" for emotion, count in emotion_counts.items()])
 
     emotion_text = " ".join(emotions_detected)
-    sentiment = sia.polarity_scores(emotion_text)
+    sentiment = model_registry.get("sia").polarity_scores(emotion_text)
 
-    print("\nDetected Emotions:")
-    print(detected_emotions)
-    print("\nSentiment Analysis:")
-    print(sentiment)
+    if verbose:
+        print("\nDetected Emotions:")
+        print(detected_emotions)
+        print("\nSentiment Analysis:")
+        print(sentiment)
 
     return {
         "emotions_detected": detected_emotions,
+        "emotion_timeline": emotion_timeline,
         "sentiment_analysis": sentiment
     }
 
 
-def video_to_text(video_file, output_text_file):
-    audio_file = "temp_audio.wav"
+def recognize_emotions(video_file, batch_size=32, sample_every=0.5, seek=False, face_detector=None):
+    webcam = cv2.VideoCapture(video_file)
     try:
-        video = mp.VideoFileClip(video_file)
-        video.audio.write_audiofile(audio_file)
+        frames = ((timestamp, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                  for timestamp, frame in sample_frames(webcam, sample_every, seek))
+        emotions_detected, emotion_timeline = emotions_from_frames(frames, batch_size, face_detector)
+    finally:
+        webcam.release()
+    return summarize_emotions(emotions_detected, emotion_timeline)
+
+
+def transcript_from_segments(segments):
+    failed = [segment for segment in segments if segment["error"]]
+    for segment in failed:
+        print(f"Warning: transcription failed for {segment['start']}s-{segment['end']}s: {segment['error']}")
+    if segments and len(failed) == len(segments):
+        return f"Error in audio transcription: {failed[0]['error']}"
+    return transcription.stitch_segments(segments)
+
+
+def video_to_text(video_file, output_text_file, backend="google", chunk_seconds=30, overlap_seconds=1.0,
+                  split_on_silence=False, workers=4):
+    try:
+        with profiling.stage("audio.decode"):
+            pcm = transcription.extract_pcm(video_file)
     except Exception as e:
         return f"Error in extracting audio: {e}"
 
-    recognizer = sr.Recognizer()
     try:
-        with sr.AudioFile(audio_file) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
+        with profiling.stage("audio.recognize"):
+            segments = transcription.transcribe_pcm(pcm, transcription.SAMPLE_RATE, backend, chunk_seconds,
+                                                    overlap_seconds, split_on_silence, workers)
     except Exception as e:
         return f"Error in audio transcription: {e}"
 
+    text = transcript_from_segments(segments)
+    if text.startswith("Error in audio transcription"):
+        return text
+
     with open(output_text_file, "w", encoding="utf-8") as file:
         file.write(text)
 
-    # Optional: Remove temporary audio file
-    if os.path.exists(audio_file):
-        os.remove(audio_file)
-
     return text
 
 
+def check_video_options(sample_every=0.5, chunk_seconds=30, overlap_seconds=1.0, split_on_silence=False):
+    # Raises ValueError before any decoding starts; callers report it as a
+    # usage error.
+    if sample_every <= 0:
+        raise ValueError(f"sample_every must be more than 0 seconds, got {sample_every}")
+    transcription.check_chunking(chunk_seconds, overlap_seconds, split_on_silence)
+
+
+def open_video_streams(video_file, sample_every=0.5):
+    # Returns sampled (seconds, gray frame) pairs, a callable giving an
+    # iterator of PCM blocks, and a close callable. Frames and audio must be
+    # consumed concurrently when they come from the single ffmpeg demuxer.
+    if video_demux.can_demux_once():
+        process, frames, audio_blocks = video_demux.demux(video_file, sample_every)
+
+        def close():
+            frames.close()
+            process.stdout.close()
+            process.wait()
+    else:
+        webcam = cv2.VideoCapture(video_file)
+        frames = ((timestamp, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                  for timestamp, frame in sample_frames(webcam, sample_every))
+        def audio_blocks():
+            yield transcription.extract_pcm(video_file)
+
+        def close():
+            frames.close()
+            webcam.release()
+
+    return frames, audio_blocks, close
+
+
+def video_resume_result(emotions_detected, emotion_timeline, transcript, segments, verbose=True):
+    # Attach what the candidate's face showed while each piece was spoken.
+    for segment in segments:
+        segment_emotions = [label for timestamp, label in emotion_timeline
+                            if segment["start"] <= timestamp < segment["end"]]
+        segment["emotions"] = dict(Counter(segment_emotions))
+
+    result = summarize_emotions(emotions_detected, emotion_timeline, verbose)
+    result.update({
+        "transcript": transcript,
+        "segments": segments
+    })
+    return result
+
+
+def analyze_video_resume(video_file, output_text_file=None, sample_every=0.5, batch_size=32, backend="google",
+                         chunk_seconds=30, overlap_seconds=1.0, split_on_silence=False, workers=4,
+                         face_detector=None):
+    # The emotion stage and the transcription stage run side by side, so the
+    # wall-clock time is roughly the longer of the two instead of their sum.
+    check_video_options(sample_every, chunk_seconds, overlap_seconds, split_on_silence)
+    started = time.perf_counter()
+    timings = {}
+    frames, audio_blocks, close = open_video_streams(video_file, sample_every)
+
+    def run_emotions():
+        stage_started = time.perf_counter()
+        try:
+            return emotions_from_frames(frames, batch_size, face_detector)
+        finally:
+            close()
+            timings["emotions"] = round(time.perf_counter() - stage_started, 3)
+
+    def run_transcription():
+        # Chunks are recognized as the audio arrives; with the demuxer the
+        # audio ends only when the emotion stage has read the last frame.
+        stage_started = time.perf_counter()
+
+        def decoded():
+            for block in profiling.iter_stage("audio.decode", audio_blocks()):
+                timings["audio_decode"] = round(time.perf_counter() - stage_started, 3)
+                yield block
+
+        try:
+            with profiling.stage("audio.recognize"):
+                segments = transcription.transcribe_stream(decoded(), transcription.SAMPLE_RATE, backend,
+                                                           chunk_seconds, overlap_seconds, split_on_silence,
+                                                           workers)
+            if not segments:
+                raise RuntimeError("no audio track found")
+            return segments
+        finally:
+            timings["transcription"] = round(time.perf_counter() - stage_started, 3)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        emotion_future = executor.submit(run_emotions)
+        transcription_future = executor.submit(run_transcription)
+        emotions_detected, emotion_timeline = emotion_future.result()
+        try:
+            segments = transcription_future.result()
+            transcript = transcript_from_segments(segments)
+        except Exception as e:
+            segments = []
+            transcript = f"Error in audio transcription: {e}"
+
+    if output_text_file and not transcript.startswith("Error"):
+        with open(output_text_file, "w", encoding="utf-8") as file:
+            file.write(transcript)
+
+    result = video_resume_result(emotions_detected, emotion_timeline, transcript, segments)
+    timings["total"] = round(time.perf_counter() - started, 3)
+    result["timings"] = timings
+    return result
+
+
 if __name__ == "__main__":
     # Resume Analysis
     folder_path = input("Enter the folder path containing CVs (PDFs and/or TXT): ").strip()
@@ -240,7 +868,9 @@ if __name__ == "__main__":
     skill_set = {keyword.strip().lower() for keyword in user_keywords.split(",")}
 
     if os.path.isdir(folder_path):
-        analysis_results = process_folder(folder_path, skill_set)
+        analysis_results = process_folder(folder_path, skill_set, workers=os.cpu_count(),
+                                          cache_dir=pdf_cache.DEFAULT_CACHE_DIR,
+                                          index_path=os.path.join(folder_path, ".cv_index.sqlite"), use_ocr=True)
         ranked_resumes = rank_resumes(analysis_results, skill_set)
         print("\nRanked Resumes:")
         for rank, (file_name, score) in enumerate(ranked_resumes, start=1):
@@ -253,8 +883,8 @@ if __name__ == "__main__":
     if video_file:
         if os.path.isfile(video_file):
             print("\nAnalyzing Video Resume...")
-            emotion_results = recognize_emotions(video_file)
-            transcript = video_to_text(video_file, "video_transcript.txt")
+            video_results = analyze_video_resume(video_file, "video_transcript.txt")
+            transcript = video_results["transcript"]
             print("\nTranscribed Text from Video:")
             print(transcript if transcript else "No transcription available.")
         else:
@@ -0,0 +1,57 @@
+import threading
+
+_loaders = {}
+_models = {}
+_locks = {}
+_registry_lock = threading.Lock()
+_owners = {}
+_local = threading.local()
+
+
+def register(name, loader):
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+        _models.pop(name, None)
+        _owners.pop(name, None)
+
+
+def get(name):
+    # Loaded on first use and kept for the life of the process. The per-name
+    # lock makes concurrent first calls wait for one load instead of racing.
+    try:
+        return _models[name]
+    except KeyError:
+        pass
+    with _locks[name]:
+        if name not in _models:
+            _models[name] = _loaders[name]()
+        return _models[name]
+
+
+def get_local(name):
+    # For models one thread at a time may use, such as OpenCV's cascade and
+    # dnn.Net. The first thread to ask gets the shared instance, every other
+    # thread loads its own copy once and keeps it.
+    models = getattr(_local, "models", None)
+    if models is None:
+        models = _local.models = {}
+    if name not in models:
+        with _registry_lock:
+            owner = _owners.setdefault(name, threading.get_ident())
+        models[name] = get(name) if owner == threading.get_ident() else _loaders[name]()
+    return models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def warm_up(*names):
+    for name in names or list(_loaders):
+        get(name)
+
+
+def unload(name):
+    with _locks[name]:
+        _models.pop(name, None)
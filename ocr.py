@@ -0,0 +1,103 @@
+import contextlib
+import hashlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+
+import pdf_cache
+
+# Bump when rendering or OCR settings change so cached page text is redone.
+OCR_VERSION = "tesseract-1"
+DEFAULT_DPI = 300
+DEFAULT_LANG = "eng"
+
+_tesseract_apis = {}
+
+
+def available():
+    # Pages are rendered with PyMuPDF whichever Tesseract binding reads them.
+    try:
+        import fitz
+    except ImportError:
+        return False
+    for module in ("tesserocr", "pytesseract"):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+def _tesseract_api(lang):
+    # One Tesseract instance per process and language, loading the language
+    # data costs more than OCR-ing a small page.
+    api = _tesseract_apis.get(lang)
+    if api is None:
+        import tesserocr
+        api = tesserocr.PyTessBaseAPI(lang=lang)
+        _tesseract_apis[lang] = api
+    return api
+
+
+def ocr_gray(samples, width, height, stride, lang=DEFAULT_LANG):
+    # tesserocr takes the raw 8-bit buffer directly. pytesseract is the
+    # fallback when tesserocr is not installed, it still writes a temp image.
+    try:
+        api = _tesseract_api(lang)
+    except ImportError:
+        import pytesseract
+        from PIL import Image
+        image = Image.frombuffer("L", (width, height), samples, "raw", "L", stride, 1)
+        return pytesseract.image_to_string(image, lang=lang)
+    api.SetImageBytes(samples, width, height, 1, stride)
+    return api.GetUTF8Text()
+
+
+def ocr_page(pdf_path, page_no, dpi=DEFAULT_DPI, cache_dir=None, lang=DEFAULT_LANG):
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[page_no - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    samples = pixmap.samples
+    if not cache_dir:
+        return ocr_gray(samples, pixmap.width, pixmap.height, pixmap.stride, lang)
+
+    # Keyed by the rendered page, so the same scanned page inside a different
+    # or re-saved PDF is not OCR-ed twice. The entries share the text cache's
+    # directory and so its size limit.
+    digest = hashlib.sha256(samples)
+    digest.update(f":{pixmap.width}x{pixmap.height}:{dpi}:{lang}:{OCR_VERSION}".encode("utf-8"))
+    entry = pdf_cache.load_or_compute(
+        cache_dir, digest.hexdigest(),
+        lambda: {"text": ocr_gray(samples, pixmap.width, pixmap.height, pixmap.stride, lang)})
+    return entry["text"]
+
+
+@contextlib.contextmanager
+def shared_pool(workers):
+    # Turns a worker count into one pool for a whole run, so each document
+    # does not pay for starting processes and each worker loads Tesseract's
+    # language data once. Anything else (0, 1 or an executor) passes through.
+    if isinstance(workers, int) and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield executor
+    else:
+        yield workers
+
+
+def ocr_pdf_pages(pdf_path, page_numbers, dpi=DEFAULT_DPI, workers=1, cache_dir=None, lang=DEFAULT_LANG):
+    # Returns {page_no: text}. workers is a process count or a shared_pool
+    # executor. Pages go to a process pool when there is more than one to
+    # do, each worker renders its own page from the file so only the path
+    # crosses the process boundary, not the bitmap.
+    page_numbers = list(page_numbers)
+    if isinstance(workers, Executor):
+        texts = list(workers.map(ocr_page, repeat(pdf_path), page_numbers, repeat(dpi), repeat(cache_dir),
+                                 repeat(lang)))
+    elif workers > 1 and len(page_numbers) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(page_numbers))) as executor:
+            texts = list(executor.map(ocr_page, repeat(pdf_path), page_numbers, repeat(dpi),
+                                      repeat(cache_dir), repeat(lang)))
+    else:
+        texts = [ocr_page(pdf_path, page_no, dpi, cache_dir, lang) for page_no in page_numbers]
+    return dict(zip(page_numbers, texts))
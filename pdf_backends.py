@@ -0,0 +1,170 @@
+import importlib.metadata
+import os
+import re
+import sys
+import time
+
+# Fastest first, "auto" walks this order.
+AUTO_ORDER = ("pymupdf", "pypdf", "pdfplumber")
+BACKEND_PACKAGES = {"pymupdf": "pymupdf", "pypdf": "pypdf", "pdfplumber": "pdfplumber"}
+
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+# Once one backend found no text anywhere in a document, the others only
+# look this far into it before the document is taken to be a scan.
+EMPTY_PROBE_PAGES = 3
+
+
+def _page(page_no, text, width, height):
+    return {"page": page_no, "text": text, "chars": len(text), "width": float(width), "height": float(height)}
+
+
+# Each backend is a generator so a caller can stop after the pages it
+# needs; max_pages stops the parser itself from reading further.
+
+def iter_pymupdf(pdf_path, max_pages=None):
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        for page_no, page in enumerate(doc, start=1):
+            if max_pages and page_no > max_pages:
+                break
+            yield _page(page_no, page.get_text(), page.rect.width, page.rect.height)
+
+
+def iter_pypdf(pdf_path, max_pages=None):
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    for page_no, page in enumerate(reader.pages, start=1):
+        if max_pages and page_no > max_pages:
+            break
+        yield _page(page_no, page.extract_text() or "", page.mediabox.width, page.mediabox.height)
+
+
+def iter_pdfplumber(pdf_path, max_pages=None):
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_no, page in enumerate(pdf.pages, start=1):
+            if max_pages and page_no > max_pages:
+                break
+            yield _page(page_no, page.extract_text() or "", page.width, page.height)
+            # pdfplumber keeps parsed layout objects on the page until asked.
+            page.flush_cache()
+
+
+BACKENDS = {"pymupdf": iter_pymupdf, "pypdf": iter_pypdf, "pdfplumber": iter_pdfplumber}
+
+
+def available_backends():
+    found = []
+    for name in AUTO_ORDER:
+        try:
+            importlib.metadata.version(BACKEND_PACKAGES[name])
+        except importlib.metadata.PackageNotFoundError:
+            continue
+        found.append(name)
+    return found
+
+
+def backend_chain(backend):
+    if backend == "auto":
+        return available_backends()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend {backend!r}, expected one of {sorted(BACKENDS)} or 'auto'")
+    return [backend]
+
+
+def extractor_version(backend, max_pages=None):
+    # Part of the text cache key: a different backend, or a new release of
+    # one, can return different text for the same file.
+    version = "+".join(f"{name}-{importlib.metadata.version(BACKEND_PACKAGES[name])}"
+                       for name in backend_chain(backend)) + "-2"
+    return f"{version}-p{max_pages}" if max_pages else version
+
+
+def looks_garbled(text):
+    # Broken font encodings come out as (cid:NN) runs, replacement or
+    # control characters, or text with hardly any letters in it.
+    stripped = "".join(text.split())
+    if not stripped:
+        return False
+    bad = sum(len(match) for match in CID_PATTERN.findall(stripped))
+    bad += sum(1 for c in stripped if c == "\ufffd" or (ord(c) < 32))
+    letters = sum(1 for c in stripped if c.isalpha())
+    return bad / len(stripped) > 0.1 or letters / len(stripped) < 0.3
+
+
+def iter_pages(pdf_path, backend="auto", max_pages=None):
+    # "auto" decides on the first page that has any text: if it is garbled
+    # the next backend starts over, otherwise the rest streams from the
+    # same parser. If a backend finds no text at all, the next ones try the
+    # first EMPTY_PROBE_PAGES pages; a scan with no text layer comes from
+    # the first backend that could open it.
+    chain = backend_chain(backend)
+    if not chain:
+        raise RuntimeError("No PDF backend installed, need one of pymupdf, pypdf or pdfplumber")
+    empty = None
+    for name in chain:
+        pages = BACKENDS[name](pdf_path, max_pages)
+        held = []
+        try:
+            for page in pages:
+                held.append(page)
+                if page["text"].strip() or (empty is not None and len(held) >= EMPTY_PROBE_PAGES):
+                    break
+        except Exception:
+            pages.close()
+            if len(chain) == 1:
+                raise
+            continue
+        if not held or not held[-1]["text"].strip():
+            pages.close()
+            if empty is None:
+                empty = held
+            continue
+        if name != chain[-1] and looks_garbled(held[-1]["text"]):
+            pages.close()
+            continue
+        yield from held
+        yield from pages
+        return
+    if empty is None:
+        raise RuntimeError(f"No PDF backend could read {pdf_path}")
+    yield from empty
+
+
+def extract_pages(pdf_path, backend="auto", max_pages=None):
+    return list(iter_pages(pdf_path, backend, max_pages))
+
+
+def benchmark(folder_path, backends=None, repeat=3):
+    # Pages per second for each backend over the PDFs in folder_path.
+    pdf_paths = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path)) if f.endswith(".pdf")]
+    report = {}
+    for name in backends or available_backends():
+        pages = 0
+        chars = 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for pdf_path in pdf_paths:
+                extracted = list(BACKENDS[name](pdf_path))
+                pages += len(extracted)
+                chars += sum(page["chars"] for page in extracted)
+        elapsed = time.perf_counter() - started
+        report[name] = {
+            "files": len(pdf_paths),
+            "pages": pages // repeat,
+            "chars": chars // repeat,
+            "seconds": round(elapsed / repeat, 4),
+            "pages_per_sec": round(pages / elapsed, 1) if elapsed else None
+        }
+    return report
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "Text Converted")
+    for name, result in benchmark(folder).items():
+        print(f"{name:<11} {result['pages_per_sec']:>8} pages/sec  ({result['pages']} pages, "
+              f"{result['chars']} chars, {result['seconds']}s per pass)")
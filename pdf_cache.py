@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+import atomic_files
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "cvaiexpert", "pdf_text")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write to a temp file and rename so concurrent workers never see a
+    # half-written entry.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_files.atomic_write(path, durable=False) as f:
+        json.dump(data, f)
+
+
+def _entry_path(cache_dir, key):
+    return os.path.join(cache_dir, "entries", key[:2], f"{key}.json")
+
+
+def content_digest(cache_dir, path):
+    # Re-hash only when size or mtime changed since the digest was recorded.
+    stat = os.stat(path)
+    path_key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    stat_path = os.path.join(cache_dir, "paths", path_key[:2], f"{path_key}.json")
+    recorded = _read_json(stat_path)
+    if recorded and recorded.get("size") == stat.st_size and recorded.get("mtime_ns") == stat.st_mtime_ns:
+        return recorded["digest"]
+    digest = file_digest(path)
+    _write_json(stat_path, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest})
+    return digest
+
+
+def cache_key(cache_dir, path, extractor_version):
+    return hashlib.sha256(f"{content_digest(cache_dir, path)}:{extractor_version}".encode("utf-8")).hexdigest()
+
+
+def make_entry(pages):
+    return {
+        "text": "".join(page["text"] for page in pages),
+        "pages": [{k: v for k, v in page.items() if k != "text"} for page in pages],
+    }
+
+
+def load_or_compute(cache_dir, key, compute):
+    entry_path = _entry_path(cache_dir, key)
+    entry = _read_json(entry_path)
+    if entry is not None:
+        # The entry's mtime doubles as its last-used time for LRU eviction.
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return entry
+
+    entry = compute()
+    _write_json(entry_path, entry)
+    return entry
+
+
+def load_or_extract(cache_dir, path, extractor_version, extract_pages):
+    return load_or_compute(cache_dir, cache_key(cache_dir, path, extractor_version),
+                           lambda: make_entry(extract_pages(path)))
+
+
+def prune_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    entries = []
+    total = 0
+    for root, _, file_names in os.walk(os.path.join(cache_dir, "entries")):
+        for file_name in file_names:
+            entry_path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total += stat.st_size
+
+    removed = 0
+    for _, size, entry_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(entry_path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,247 @@
+import contextlib
+import functools
+import json
+import math
+import threading
+import time
+
+# Stage timings are only collected between enable() and disable(). While
+# disabled, stage() hands back one shared no-op context manager and timed()
+# functions go straight to the wrapped call, so the hooks can stay in the
+# hot paths.
+_collector = None
+_profiler = None
+_NOOP = contextlib.nullcontext()
+
+# Histogram upper bounds in milliseconds, powers of two from 1/16 ms to ~65 s.
+BUCKET_BOUNDS_MS = tuple(2.0 ** i for i in range(-4, 17))
+
+
+class Collector:
+    # Per stage: calls, total and self time (self excludes nested stages on
+    # the same thread), min/max and a latency histogram. Plain counters are
+    # kept next to them.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stages = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def _stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def push(self):
+        # Each frame holds the time spent in its nested stages.
+        self._stack().append(0.0)
+
+    def pop(self, name, elapsed):
+        stack = self._stack()
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.record(name, elapsed, elapsed - nested)
+
+    def record(self, name, elapsed, self_time=None, calls=1):
+        bucket = len(BUCKET_BOUNDS_MS)
+        elapsed_ms = elapsed * 1000
+        for i, bound in enumerate(BUCKET_BOUNDS_MS):
+            if elapsed_ms <= bound:
+                bucket = i
+                break
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = {"calls": 0, "total": 0.0, "self": 0.0, "min": math.inf, "max": 0.0,
+                                             "buckets": [0] * (len(BUCKET_BOUNDS_MS) + 1)}
+            stats["calls"] += calls
+            stats["total"] += elapsed
+            stats["self"] += elapsed if self_time is None else self_time
+            stats["min"] = min(stats["min"], elapsed)
+            stats["max"] = max(stats["max"], elapsed)
+            stats["buckets"][bucket] += calls
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        with self.lock:
+            return {"stages": {name: dict(stats, buckets=list(stats["buckets"]))
+                               for name, stats in self.stages.items()},
+                    "counters": dict(self.counters)}
+
+    def merge(self, snapshot):
+        # Folds in a snapshot from another process, e.g. a pool worker.
+        with self.lock:
+            for name, other in snapshot["stages"].items():
+                stats = self.stages.get(name)
+                if stats is None:
+                    self.stages[name] = dict(other, buckets=list(other["buckets"]))
+                    continue
+                for key in ("calls", "total", "self"):
+                    stats[key] += other[key]
+                stats["min"] = min(stats["min"], other["min"])
+                stats["max"] = max(stats["max"], other["max"])
+                stats["buckets"] = [a + b for a, b in zip(stats["buckets"], other["buckets"])]
+            for name, n in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        snapshot = self.snapshot()
+        stages = {}
+        for name, stats in sorted(snapshot["stages"].items(), key=lambda item: -item[1]["self"]):
+            histogram = {}
+            for i, calls in enumerate(stats["buckets"]):
+                if calls:
+                    label = f"<={BUCKET_BOUNDS_MS[i]:g}ms" if i < len(BUCKET_BOUNDS_MS) else \
+                        f">{BUCKET_BOUNDS_MS[-1]:g}ms"
+                    histogram[label] = calls
+            stages[name] = {
+                "calls": stats["calls"],
+                "total_s": round(stats["total"], 6),
+                "self_s": round(stats["self"], 6),
+                "mean_ms": round(stats["total"] / stats["calls"] * 1000, 4) if stats["calls"] else None,
+                "min_ms": round(stats["min"] * 1000, 4) if stats["calls"] else None,
+                "max_ms": round(stats["max"] * 1000, 4),
+                "histogram": histogram
+            }
+        return {"wall_s": round(time.perf_counter() - self.started, 6), "stages": stages,
+                "counters": snapshot["counters"]}
+
+
+class _Stage:
+    __slots__ = ("collector", "name", "started")
+
+    def __init__(self, collector, name):
+        self.collector = collector
+        self.name = name
+
+    def __enter__(self):
+        self.collector.push()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.collector.pop(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def is_enabled():
+    return _collector is not None
+
+
+def stage(name):
+    if _collector is None:
+        return _NOOP
+    return _Stage(_collector, name)
+
+
+def timed(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _collector is None:
+                return function(*args, **kwargs)
+            with _Stage(_collector, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def iter_stage(name, iterable):
+    # Times each step of an iterator, e.g. decoding the next frame or
+    # nlp.pipe producing the next doc. Work done in nested stages while the
+    # step runs (such as the generator feeding nlp.pipe) is not counted as
+    # this stage's self time.
+    if _collector is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def count(name, n=1):
+    if _collector is not None:
+        _collector.count(name, n)
+
+
+def snapshot():
+    return _collector.snapshot() if _collector is not None else None
+
+
+def merge(other):
+    if _collector is not None and other:
+        _collector.merge(other)
+
+
+def drain():
+    # Snapshot and reset, for pool workers that report per task.
+    global _collector
+    if _collector is None:
+        return None
+    data = _collector.snapshot()
+    _collector = Collector()
+    return data
+
+
+def enable(profiler=None):
+    # profiler: None, "cprofile" or "pyinstrument". cProfile only sees the
+    # thread that called enable().
+    global _collector, _profiler
+    _collector = Collector()
+    _profiler = None
+    if profiler == "cprofile":
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    elif profiler == "pyinstrument":
+        from pyinstrument import Profiler
+        _profiler = Profiler()
+        _profiler.start()
+    elif profiler is not None:
+        raise ValueError(f"Unknown profiler {profiler!r}, expected 'cprofile' or 'pyinstrument'")
+
+
+def disable(report_path=None, profile_path=None):
+    # Stops collecting and returns the report; writes it as JSON and the
+    # profiler's output (pstats for cProfile, HTML for pyinstrument) when
+    # paths are given.
+    global _collector, _profiler
+    if _collector is None:
+        return None
+    report = _collector.report()
+    profiler, _collector, _profiler = _profiler, None, None
+    if profiler is not None:
+        if hasattr(profiler, "disable"):
+            profiler.disable()
+            if profile_path:
+                profiler.dump_stats(profile_path)
+        else:
+            profiler.stop()
+            if profile_path:
+                with open(profile_path, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+@contextlib.contextmanager
+def profiled(report_path=None, profiler=None, profile_path=None):
+    enable(profiler)
+    try:
+        yield
+    finally:
+        disable(report_path, profile_path)
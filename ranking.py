@@ -0,0 +1,115 @@
+from array import array
+
+import numpy as np
+
+SKILL_POINTS = 10
+CONTACT_POINTS = 5
+# Rows unpacked per block when scoring, keeps the float32 block near 64 MB
+# even for a few thousand distinct skills.
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def contact_bonus(result):
+    bonus = 0
+    if result.get("Name") and result["Name"] != "Name not found":
+        bonus += CONTACT_POINTS
+    if result.get("Emails") and result["Emails"][0] != "Email not found":
+        bonus += CONTACT_POINTS
+    if result.get("Phone Numbers") and result["Phone Numbers"][0] != "Phone number not found":
+        bonus += CONTACT_POINTS
+    return bonus
+
+
+def score_result(result, required_skills):
+    # One candidate scored the way score_candidates scores them in bulk.
+    skills_found = set(result.get("Skills Found", []))
+    matching_skills = {skill for skill in required_skills if skill in skills_found}
+    return len(matching_skills) * SKILL_POINTS + contact_bonus(result)
+
+
+def build_skill_matrix(analysis_results):
+    # Candidates x skills as a bit-packed matrix: 200k candidates with 1,000
+    # distinct skills take 25 MB instead of 200k Python sets.
+    file_names = list(analysis_results)
+    skills = sorted({skill for result in analysis_results.values()
+                     for skill in result.get("Skills Found", []) if skill != "No skills found"})
+    skill_index = {skill: i for i, skill in enumerate(skills)}
+
+    rows = array("i")
+    columns = array("i")
+    bonus = np.zeros(len(file_names), dtype=np.int32)
+    for row, file_name in enumerate(file_names):
+        result = analysis_results[file_name]
+        for skill in result.get("Skills Found", []):
+            column = skill_index.get(skill)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+        bonus[row] = contact_bonus(result)
+
+    # Bits are set straight into the packed array in np.packbits' order
+    # (first column in the high bit), never a dense bool matrix.
+    bits = np.zeros((len(file_names), (len(skills) + 7) // 8), dtype=np.uint8)
+    rows = np.frombuffer(rows, dtype=np.int32)
+    columns = np.frombuffer(columns, dtype=np.int32)
+    np.bitwise_or.at(bits, (rows, columns >> 3), (0x80 >> (columns & 7)).astype(np.uint8))
+
+    return {
+        "files": file_names,
+        "skills": skills,
+        "skill_index": skill_index,
+        "bits": bits,
+        "bonus": bonus
+    }
+
+
+def skill_vectors(matrix, skill_sets):
+    vectors = np.zeros((len(matrix["skills"]), len(skill_sets)), dtype=np.float32)
+    for column, skill_set in enumerate(skill_sets):
+        rows = [matrix["skill_index"][skill] for skill in skill_set if skill in matrix["skill_index"]]
+        vectors[rows, column] = 1.0
+    return vectors
+
+
+def score_candidates(matrix, skill_sets):
+    # One (candidates x skills) @ (skills x profiles) product per block of
+    # rows gives every candidate's score against every skill set at once.
+    n_files = len(matrix["files"])
+    n_skills = len(matrix["skills"])
+    vectors = skill_vectors(matrix, skill_sets)
+    scores = np.empty((n_files, len(skill_sets)), dtype=np.int32)
+    block_rows = max(1, BLOCK_BYTES // max(1, n_skills * 4))
+    for start in range(0, n_files, block_rows):
+        stop = min(start + block_rows, n_files)
+        block = np.unpackbits(matrix["bits"][start:stop], axis=1, count=n_skills).astype(np.float32)
+        matched = np.rint(block @ vectors).astype(np.int32)
+        scores[start:stop] = matched * SKILL_POINTS + matrix["bonus"][start:stop, None]
+    return scores
+
+
+def check_top_k(k):
+    # k=0 would rank nobody and a negative k would drop the last candidates.
+    if k is not None and k < 1:
+        raise ValueError(f"top_k must be at least 1, got {k}")
+
+
+def top_k(scores, k=None):
+    # Best first, ties keep their original order like a stable sort would.
+    check_top_k(k)
+    candidates = np.arange(len(scores))
+    if k is not None and 0 < k < len(scores):
+        # argpartition breaks ties at the cut arbitrarily, so keep everything
+        # tied with the k-th score and let the stable ordering decide.
+        cutoff = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= cutoff)
+    ordered = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return ordered if k is None else ordered[:k]
+
+
+def rank_candidates(matrix, skill_sets, k=None):
+    scores = score_candidates(matrix, skill_sets)
+    rankings = []
+    for column in range(len(skill_sets)):
+        column_scores = scores[:, column]
+        rankings.append([(matrix["files"][row], int(column_scores[row])) for row in top_k(column_scores, k)])
+    return rankings
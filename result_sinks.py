@@ -0,0 +1,359 @@
+import glob
+import json
+import os
+
+import atomic_files
+import final_3
+import pdf_cache
+import ranking
+
+# Column types shared by every sink; Parquet and Arrow need them up front.
+RESULT_COLUMNS = {"file": "str", "digest": "str", "status": "str", "score": "int", "Name": "str", "Emails": "list",
+                  "Phone Numbers": "list", "Links": "list", "Skills Found": "list"}
+RANK_COLUMNS = {"rank": "int", "file": "str", "score": "int"}
+# Records between fsyncs (JSON Lines) or per part file (Parquet, Arrow). A
+# crash loses at most this many records, which the rerun analyzes again.
+CHECKPOINT_EVERY = 1000
+# Share of an output's records that may be superseded before a rerun
+# compacts it.
+COMPACT_FRACTION = 0.2
+FORMATS = ("jsonl", "parquet", "arrow")
+EXTENSIONS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow",
+              ".feather": "arrow", ".ipc": "arrow"}
+
+
+def drop_torn_line(output_path):
+    # A crash mid-write can leave a partial last line; cut it off so new
+    # records start on a clean line.
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as results:
+        data = results.read()
+        if data and not data.endswith(b"\n"):
+            results.truncate(data.rfind(b"\n") + 1)
+
+
+def read_run(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_run(path, run):
+    with atomic_files.atomic_write(path) as f:
+        json.dump(run, f)
+
+
+def format_for(path):
+    # None when the extension names no format this module writes.
+    extension = os.path.splitext(path.rstrip("/\\"))[1].lower()
+    return EXTENSIONS.get(extension)
+
+
+class JsonlSink:
+    # Appends one JSON object per line, flushed as it is written and fsync'd
+    # every checkpoint_every records. Whatever complete lines are on disk
+    # are there to resume from.
+
+    def __init__(self, path, columns, checkpoint_every=CHECKPOINT_EVERY):
+        self.path = path
+        self.columns = columns
+        self.checkpoint_every = checkpoint_every
+        self.stream = None
+        self.unsynced = 0
+
+    def meta_path(self):
+        return self.path + ".run.json"
+
+    def open(self, resume=True):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if resume:
+            drop_torn_line(self.path)
+        self.stream = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def read(self, columns=None):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield {key: record.get(key) for key in columns} if columns else record
+
+    def write(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        if self.stream is not None:
+            self.checkpoint()
+            self.stream.close()
+            self.stream = None
+
+    def rewrite(self, records):
+        # Replaces the file with just these records, then appends after them.
+        self.close()
+        with atomic_files.atomic_write(self.path) as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        self.open(resume=True)
+
+
+class ArrowSink:
+    # Writes a directory of part files, one per checkpoint_every records,
+    # which pandas.read_parquet, pyarrow.dataset or DuckDB load as one
+    # table. A part is written under a temp name, fsync'd and renamed, so a
+    # part either exists whole or not at all. Rows still buffered when the
+    # process dies are analyzed again on the rerun.
+
+    def __init__(self, path, columns, checkpoint_every=CHECKPOINT_EVERY, output_format="parquet"):
+        import pyarrow as pa
+
+        types = {"str": pa.string(), "int": pa.int64(), "list": pa.list_(pa.string())}
+        self.pa = pa
+        self.path = path
+        self.columns = columns
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns.items()])
+        self.checkpoint_every = checkpoint_every
+        self.format = output_format
+        self.extension = ".parquet" if output_format == "parquet" else ".arrow"
+        self.rows = []
+        self.next_part = 0
+
+    def meta_path(self):
+        return os.path.join(self.path, "_run.json")
+
+    def parts(self):
+        return sorted(glob.glob(os.path.join(glob.escape(self.path), "part-*" + self.extension)))
+
+    def open(self, resume=True):
+        os.makedirs(self.path, exist_ok=True)
+        for tmp_path in glob.glob(os.path.join(glob.escape(self.path), "*.tmp")):
+            os.remove(tmp_path)
+        if not resume:
+            for part in self.parts():
+                os.remove(part)
+        parts = self.parts()
+        self.next_part = int(os.path.basename(parts[-1])[5:-len(self.extension)]) + 1 if parts else 0
+
+    def _read_part(self, part, columns):
+        # Columns a part was written without come back as None.
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            names = pq.read_schema(part).names
+            table = pq.read_table(part, columns=[name for name in columns if name in names] if columns else None)
+        else:
+            import pyarrow.ipc as ipc
+            with self.pa.memory_map(part) as source:
+                table = ipc.open_file(source).read_all()
+            if columns:
+                table = table.select([name for name in columns if name in table.column_names])
+        rows = table.to_pylist()
+        if columns and len(table.column_names) < len(columns):
+            rows = [{name: row.get(name) for name in columns} for row in rows]
+        return rows
+
+    def read(self, columns=None):
+        for part in self.parts():
+            yield from self._read_part(part, list(columns) if columns else None)
+
+    def write(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if not self.rows:
+            return
+        table = self.pa.Table.from_pylist([{name: row.get(name) for name in self.columns} for row in self.rows],
+                                          schema=self.schema)
+        part = os.path.join(self.path, f"part-{self.next_part:05d}{self.extension}")
+        with atomic_files.atomic_write(part, binary=True) as f:
+            if self.format == "parquet":
+                import pyarrow.parquet as pq
+                pq.write_table(table, f)
+            else:
+                import pyarrow.ipc as ipc
+                with ipc.new_file(f, self.schema) as writer:
+                    writer.write_table(table)
+        self.next_part += 1
+        self.rows = []
+
+    def close(self):
+        self.checkpoint()
+
+    def rewrite(self, records):
+        # The kept records go into new parts before the old ones are removed;
+        # a crash in between leaves duplicates, which the next resume drops
+        # by rewriting again.
+        old_parts = self.parts()
+        self.rows = []
+        for record in records:
+            self.write(record)
+        self.checkpoint()
+        for part in old_parts:
+            os.remove(part)
+        atomic_files.fsync_dir(self.path)
+
+
+def sink_format(path, output_format=None):
+    output_format = output_format or format_for(path)
+    if output_format is None:
+        raise ValueError(f"Cannot tell the format of {path} from its extension, use one of "
+                         f"{', '.join(sorted(EXTENSIONS))}")
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown result format {output_format!r}, expected one of {FORMATS}")
+    return output_format
+
+
+def make_sink(path, columns, output_format=None, checkpoint_every=CHECKPOINT_EVERY):
+    output_format = sink_format(path, output_format)
+    if output_format == "jsonl":
+        return JsonlSink(path, columns, checkpoint_every)
+    return ArrowSink(path, columns, checkpoint_every, output_format)
+
+
+def read_records(path, columns=None, output_format=None):
+    return make_sink(path, RESULT_COLUMNS, output_format).read(columns)
+
+
+def screened_skills(path):
+    # The skills the screen run behind path looked for, or None when it
+    # left no record of them (stdout, json or csv output).
+    if format_for(path) is None:
+        return None
+    run = read_run(make_sink(path, RESULT_COLUMNS).meta_path())
+    if not run or "skills" not in run:
+        return None
+    return set(run["skills"])
+
+
+def open_sink(path, columns, output_format=None, resume=True, run=None, checkpoint_every=CHECKPOINT_EVERY):
+    # run: what the records depend on (skills, options). Resuming output
+    # written for a different run would mix incompatible records, so that
+    # is refused instead.
+    sink = make_sink(path, columns, output_format, checkpoint_every)
+    if resume and run is not None:
+        previous = read_run(sink.meta_path())
+        if previous is not None and previous != run:
+            raise ValueError(f"{path} was written by a run with other skills or options; "
+                             f"pass a new output path or start over")
+    sink.open(resume)
+    if run is not None:
+        write_run(sink.meta_path(), run)
+    return sink
+
+
+def file_digests(folder_path, file_names, cache_dir=None):
+    # With a text cache its recorded digests are reused, so only files whose
+    # size or mtime changed are hashed again.
+    digests = {}
+    for file_name in file_names:
+        path = os.path.join(folder_path, file_name)
+        try:
+            digests[file_name] = pdf_cache.content_digest(cache_dir, path) if cache_dir else \
+                pdf_cache.file_digest(path)
+        except OSError:
+            # iter_folder_results reports it as failed.
+            continue
+    return digests
+
+
+def latest_records(records):
+    # {file: its last record}; a file analyzed again on a rerun has its new
+    # record appended after the old one.
+    return {record["file"]: record for record in records}
+
+
+def reusable_files(sink, digests):
+    # Files whose last record is "ok" and was made from the same content.
+    # Failed and changed files are analyzed again, superseding their old
+    # records. Records of removed files are dropped straight away, since a
+    # ranking would still list them; superseded ones only once they are
+    # COMPACT_FRACTION of the output, so a CV that fails on every run does
+    # not get the whole output rewritten every run.
+    last = {}
+    records = 0
+    for position, record in enumerate(sink.read(("file", "digest", "status"))):
+        last[record["file"]] = (position, record)
+        records += 1
+    keep = {file_name: position for file_name, (position, record) in last.items()
+            if record["status"] == "ok" and record["digest"] and record["digest"] == digests.get(file_name)}
+    removed = any(file_name not in digests for file_name in last)
+    if removed or records - len(keep) > COMPACT_FRACTION * records:
+        sink.rewrite(record for position, record in enumerate(sink.read())
+                     if keep.get(record.get("file")) == position)
+    return set(keep)
+
+
+def screen_to_sink(folder_path, user_skills, output_path, ranking_path=None, top_k=None, output_format=None,
+                   resume=True, checkpoint_every=CHECKPOINT_EVERY, **options):
+    # Streams every CV's record to output_path as it is analyzed, then ranks
+    # everything in the output into ranking_path, in the format its
+    # extension names. Nothing is held in memory but the ranking's skill
+    # matrix. On a rerun, records of files that are unchanged (same content
+    # digest) and were analyzed fine are reused; everything else is
+    # analyzed again. The output can hold superseded records until it is
+    # compacted, the last record of each file is the one that counts.
+    if ranking_path:
+        # Checked before the run rather than after it.
+        sink_format(ranking_path)
+        ranking.check_top_k(top_k)
+    run = {"skills": sorted(user_skills), "ner_window": options.get("ner_window", final_3.NER_WINDOW_LINES),
+           "max_pages": options.get("max_pages", final_3.MAX_PDF_PAGES), "use_ocr": options.get("use_ocr", False),
+           "pdf_backend": options.get("pdf_backend", final_3.PDF_BACKEND)}
+    sink = open_sink(output_path, RESULT_COLUMNS, output_format, resume, run, checkpoint_every)
+    summary = {"analyzed": 0, "failed": 0, "reused": 0}
+    try:
+        digests = file_digests(folder_path, final_3.list_cv_files(folder_path), options.get("cache_dir"))
+        reused = reusable_files(sink, digests) if resume else set()
+        summary["reused"] = len(reused)
+        if reused:
+            print(f"Reusing {len(reused)} results from {output_path} for unchanged files, analyzing "
+                  f"{len(digests) - len(reused)} new, changed or failed ones (--restart analyzes everything).")
+        for file_name, result in final_3.iter_folder_results(folder_path, user_skills, skip=reused, **options):
+            record = {"file": file_name, "digest": digests.get(file_name)}
+            if result is None:
+                record["status"] = "failed"
+                summary["failed"] += 1
+            else:
+                record.update(status="ok", score=final_3.calculate_score(result, user_skills), **result)
+                summary["analyzed"] += 1
+            sink.write(record)
+    finally:
+        sink.close()
+    if options.get("cache_dir"):
+        pdf_cache.prune_cache(options["cache_dir"])
+
+    if ranking_path:
+        summary["ranked"] = write_ranking(sink, user_skills, ranking_path, top_k, checkpoint_every=checkpoint_every)
+    return summary
+
+
+def write_ranking(sink, user_skills, ranking_path, top_k=None, output_format=None,
+                  checkpoint_every=CHECKPOINT_EVERY):
+    # The ranking depends on every result, so it is rewritten whole each run.
+    columns = ("file", "status", "Name", "Emails", "Phone Numbers", "Skills Found")
+    results = {file_name: record for file_name, record in latest_records(sink.read(columns)).items()
+               if record["status"] == "ok"}
+    ranked = final_3.rank_resumes(results, user_skills, top_k)
+    ranking = open_sink(ranking_path, RANK_COLUMNS, output_format, resume=False, checkpoint_every=checkpoint_every)
+    try:
+        for rank, (file_name, score) in enumerate(ranked, start=1):
+            ranking.write({"rank": rank, "file": file_name, "score": score})
+    finally:
+        ranking.close()
+    return len(ranked)
@@ -0,0 +1,409 @@
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import final_3
+import pdf_cache
+import profiling
+import ranking
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Most CVs queued at once before new ones are turned away with 503.
+MAX_QUEUE = 1024
+MAX_BATCH = 64
+MAX_BODY_BYTES = 16 * 1024 * 1024
+REQUEST_TIMEOUT = 120
+# CVs read from a path between two trims of the PDF text cache.
+PRUNE_EVERY = 256
+
+
+def job_field(job, name, types, description, default=None):
+    # A body field of the given JSON type; a wrong type is the client's
+    # mistake (400), not a crash further in (500).
+    value = job.get(name, default)
+    if value is None:
+        return value
+    if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+        raise ValueError(f"'{name}' must be {description}")
+    return value
+
+
+def check_result(cv_id, result):
+    # An earlier result sent back for ranking: the fields the score reads
+    # must have the types analyze_cv gave them.
+    if not isinstance(result, dict):
+        raise ValueError(f"'results' must map each id to a result object, {cv_id!r} does not")
+    name = result.get("Name")
+    if name is not None and not isinstance(name, str):
+        raise ValueError(f"'Name' of {cv_id!r} must be a string")
+    for field in ("Skills Found", "Emails", "Phone Numbers"):
+        values = result.get(field)
+        if values is not None and (not isinstance(values, list) or
+                                   not all(isinstance(value, str) for value in values)):
+            raise ValueError(f"'{field}' of {cv_id!r} must be a list of strings")
+
+
+def parse_skills(value):
+    # A list of skills or one comma-separated string.
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or not all(isinstance(skill, str) for skill in value):
+        raise ValueError("'skills' must be a comma-separated string or a list of strings")
+    return {skill.strip().lower() for skill in value if skill.strip()}
+
+
+def bucket_percentile(buckets, fraction):
+    # Upper bound of the histogram bucket holding the given share of calls.
+    total = sum(buckets)
+    if not total:
+        return None
+    seen = 0
+    for i, calls in enumerate(buckets):
+        seen += calls
+        if seen >= total * fraction:
+            return profiling.BUCKET_BOUNDS_MS[i] if i < len(profiling.BUCKET_BOUNDS_MS) else None
+    return None
+
+
+class CvBatcher:
+    # Concurrent CV requests wait in one queue and a single thread feeds them
+    # to nlp.pipe together. The thread takes whatever is queued when it is
+    # free, so a lone request runs at once and batches grow only under load;
+    # max_wait_ms > 0 holds a batch open a little longer to fill it.
+
+    def __init__(self, metrics, max_batch=MAX_BATCH, max_wait_ms=0, max_queue=MAX_QUEUE,
+                 ner_window=final_3.NER_WINDOW_LINES):
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.ner_window = ner_window
+        self.queue = queue.Queue(max_queue)
+        self.thread = threading.Thread(target=self._run, name="cv-batcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, cv_text, skill_set):
+        # Raises queue.Full when the service is saturated.
+        future = Future()
+        self.queue.put_nowait((cv_text, skill_set, future, time.perf_counter()))
+        return future
+
+    def _next_batch(self):
+        item = self.queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.perf_counter()
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            for _, _, _, queued in batch:
+                self.metrics.record("cv.queue_wait", started - queued)
+            self._analyze(batch)
+            self.metrics.record("cv.batch", time.perf_counter() - started)
+            self.metrics.count("cv.batches")
+            self.metrics.count("cv.documents", len(batch))
+
+    def _analyze(self, batch):
+        texts = (cv_text for cv_text, _, _, _ in batch)
+        docs = final_3.ner_docs(texts, len(batch), 1, self.ner_window)
+        try:
+            for (cv_text, skill_set, future, _), (_, doc, scanned) in zip(batch, docs):
+                try:
+                    future.set_result(final_3.build_cv_result(cv_text, doc, skill_set, scanned))
+                except Exception as e:
+                    future.set_exception(e)
+        except Exception as e:
+            # spaCy itself failed, so every request still waiting gets the error.
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class ScoringService:
+    # Holds the warm models, the CV batcher and a pool for video jobs, and
+    # answers the requests the HTTP handler parses.
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait_ms=0, max_queue=MAX_QUEUE, video_workers=1,
+                 ner_window=final_3.NER_WINDOW_LINES, cache_dir=None, pdf_backend=final_3.PDF_BACKEND,
+                 max_pages=final_3.MAX_PDF_PAGES, use_ocr=False, video=True, log_requests=False):
+        self.metrics = profiling.Collector()
+        self.batcher = CvBatcher(self.metrics, max_batch, max_wait_ms, max_queue, ner_window)
+        self.video = video
+        self.video_executor = ThreadPoolExecutor(max_workers=video_workers, thread_name_prefix="video") \
+            if video else None
+        self.video_lock = threading.Lock()
+        self.video_pending = 0
+        self.cache_dir = cache_dir
+        self.cache_reads = 0
+        self.cache_lock = threading.Lock()
+        self.pdf_backend = pdf_backend
+        self.max_pages = max_pages
+        self.ocr_workers = 1 if use_ocr else 0
+        self.log_requests = log_requests
+
+    def start(self):
+        # Everything is loaded before the first request, and one throwaway CV
+        # runs through spaCy so its lazy setup is paid here too.
+        final_3.warm_up_models(*final_3.CV_MODELS)
+        if self.video:
+            final_3.warm_up_models(*final_3.VIDEO_MODELS)
+        list(final_3.analyze_cvs(["Warm Up\nwarm.up@example.com"], set()))
+        self.batcher.start()
+
+    def close(self):
+        self.batcher.stop()
+        if self.video_executor is not None:
+            self.video_executor.shutdown(wait=True)
+
+    def cv_text(self, job):
+        if "text" in job:
+            return job_field(job, "text", str, "a string") or ""
+        path = job_field(job, "path", str, "a string")
+        if path is None:
+            raise ValueError("Give the CV as 'text' or a 'path' on this machine")
+        if not os.path.isfile(path):
+            raise ValueError(f"No such file: {path}")
+        text = final_3.load_cv_text(os.path.dirname(path), os.path.basename(path), self.cache_dir,
+                                    self.ocr_workers, self.pdf_backend, self.max_pages)
+        self._count_cache_read()
+        if text is None:
+            raise ValueError(f"Could not read {path}")
+        return text
+
+    def _count_cache_read(self):
+        # A long-running service never reaches the end-of-run prune the CLI
+        # does, so the cache is trimmed every PRUNE_EVERY reads instead.
+        if not self.cache_dir:
+            return
+        with self.cache_lock:
+            self.cache_reads += 1
+            prune = self.cache_reads % PRUNE_EVERY == 0
+        if prune:
+            pdf_cache.prune_cache(self.cache_dir)
+
+    def analyze_cvs(self, texts, skill_set):
+        # Everything is queued before waiting, so a rank job's CVs can share
+        # one batch.
+        futures = [self.batcher.submit(text, skill_set) for text in texts]
+        return [future.result(REQUEST_TIMEOUT) for future in futures]
+
+    def analyze_cv(self, job):
+        skill_set = parse_skills(job.get("skills"))
+        text = self.cv_text(job)
+        if not text.strip():
+            raise ValueError("The CV has no text")
+        result = self.analyze_cvs([text], skill_set)[0]
+        return {"result": result, "score": final_3.calculate_score(result, skill_set)}
+
+    def rank(self, job):
+        # Ranks earlier results ({"results": {id: result}}) or analyzes CVs
+        # first ({"cvs": {id: text}}).
+        skill_set = parse_skills(job.get("skills"))
+        if not skill_set:
+            raise ValueError("Ranking needs 'skills'")
+        results = dict(job_field(job, "results", dict, "an object of id: result") or {})
+        for cv_id, result in results.items():
+            check_result(cv_id, result)
+        cvs = job_field(job, "cvs", dict, "an object of id: text") or {}
+        if not all(isinstance(text, str) for text in cvs.values() if text is not None):
+            raise ValueError("'cvs' must map each id to the CV text")
+        cvs = {cv_id: text for cv_id, text in cvs.items() if text and text.strip()}
+        if cvs:
+            results.update(zip(cvs, self.analyze_cvs(list(cvs.values()), skill_set)))
+        if not results:
+            raise ValueError("Give 'results' or 'cvs' to rank")
+        top_k = job_field(job, "top_k", int, "an integer")
+        ranking.check_top_k(top_k)
+        ranked = final_3.rank_resumes(results, skill_set, top_k)
+        return {"ranking": [{"rank": rank, "id": cv_id, "score": score}
+                            for rank, (cv_id, score) in enumerate(ranked, start=1)]}
+
+    def analyze_video(self, job):
+        if not self.video:
+            raise ValueError("Video jobs are off for this service")
+        path = job_field(job, "path", str, "a string")
+        if not path or not os.path.isfile(path):
+            raise ValueError(f"No such video: {path}")
+        detector = job_field(job, "detector", str, "a string", "haar")
+        detect_max_width = job_field(job, "detect_max_width", int, "an integer")
+        detect_every = job_field(job, "detect_every", int, "an integer", 1)
+        sample_every = job_field(job, "sample_every", (int, float), "a number", 0.5)
+        backend = job_field(job, "backend", str, "a string", "google")
+        chunk_seconds = job_field(job, "chunk_seconds", (int, float), "a number", 30)
+        final_3.check_video_options(sample_every, chunk_seconds)
+
+        def run():
+            face_detector = final_3.make_face_detector(detector, detect_max_width, detect_every)
+            return final_3.analyze_video_resume(path, sample_every=sample_every, backend=backend,
+                                                chunk_seconds=chunk_seconds, face_detector=face_detector)
+
+        with self.video_lock:
+            self.video_pending += 1
+        try:
+            return self.video_executor.submit(run).result()
+        finally:
+            with self.video_lock:
+                self.video_pending -= 1
+
+    def report(self):
+        report = self.metrics.report()
+        snapshot = self.metrics.snapshot()["stages"]
+        for name, stats in report["stages"].items():
+            stats["p50_ms"] = bucket_percentile(snapshot[name]["buckets"], 0.5)
+            stats["p99_ms"] = bucket_percentile(snapshot[name]["buckets"], 0.99)
+        report["uptime_s"] = report.pop("wall_s")
+        report["queue_depth"] = {"cv": self.batcher.depth(), "video": self.video_pending}
+        report["models_loaded"] = [name for name in final_3.CV_MODELS + final_3.VIDEO_MODELS
+                                   if final_3.model_registry.is_loaded(name)]
+        return report
+
+
+ROUTES = {
+    ("GET", "/health"): lambda service, job: {"status": "ok"},
+    ("GET", "/metrics"): lambda service, job: service.report(),
+    ("POST", "/analyze-cv"): ScoringService.analyze_cv,
+    ("POST", "/rank"): ScoringService.rank,
+    ("POST", "/analyze-video"): ScoringService.analyze_video,
+}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # JSON in, JSON out. Keep-alive is on so a client can reuse its
+    # connection across applications.
+    protocol_version = "HTTP/1.1"
+    server_version = "CVAIexpert"
+
+    def do_GET(self):
+        self.handle_job("GET")
+
+    def do_POST(self):
+        self.handle_job("POST")
+
+    def handle_job(self, method):
+        service = self.server.service
+        path = self.path.split("?", 1)[0]
+        started = time.perf_counter()
+        route = ROUTES.get((method, path))
+        try:
+            # The body is read even for an unknown route so the next request
+            # on the connection starts in the right place.
+            job = self.read_job()
+            if route is None:
+                status, body = 404, {"error": f"No route {method} {path}"}
+            else:
+                status, body = 200, route(service, job)
+        except ValueError as e:
+            status, body = 400, {"error": str(e)}
+        except queue.Full:
+            status, body = 503, {"error": "CV queue is full, retry later"}
+        except FutureTimeout:
+            status, body = 504, {"error": "Timed out waiting for the analysis"}
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        self.send_json(status, body)
+        if route is not None:
+            service.metrics.record(f"http {method} {path}", time.perf_counter() - started)
+        service.metrics.count(f"http.{status}")
+
+    def read_job(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ValueError(f"Request body over {MAX_BODY_BYTES} bytes")
+        if not length:
+            return {}
+        try:
+            job = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Body is not JSON: {e}")
+        if not isinstance(job, dict):
+            raise ValueError("Body must be a JSON object")
+        return job
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.service.log_requests:
+            super().log_message(format, *args)
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 makes a burst of connections wait on
+    # SYN retries, a second each.
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, ServiceHandler)
+    else:
+        server = ServiceHTTPServer((host, port), ServiceHandler)
+    server.service = service
+    return server
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, **options):
+    service = ScoringService(**options)
+    service.start()
+    server = make_server(service, host, port, socket_path)
+    where = socket_path or f"http://{host}:{server.server_address[1]}"
+    print(f"Scoring service ready on {where}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
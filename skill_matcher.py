@@ -0,0 +1,107 @@
+import re
+from collections import deque
+from functools import lru_cache
+
+_WHITESPACE = re.compile(r"\s+")
+# Characters that continue a skill name, so "c" does not match inside "c++"
+# and "java" does not match inside "javascript".
+_WORD_EXTRA = "+#"
+
+
+def normalize_text(text):
+    return _WHITESPACE.sub(" ", text.lower()).strip()
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch in _WORD_EXTRA
+
+
+def _boundary_before(text, start):
+    if start == 0:
+        return True
+    prev = text[start - 1]
+    if _is_word_char(prev):
+        return False
+    # "js" inside "node.js"
+    return not (prev == "." and start >= 2 and text[start - 2].isalnum())
+
+
+def _boundary_after(text, end):
+    if end == len(text):
+        return True
+    nxt = text[end]
+    if _is_word_char(nxt):
+        return False
+    # "node" inside "node.js", but still "python" in "... python."
+    return not (nxt == "." and end + 1 < len(text) and text[end + 1].isalnum())
+
+
+class SkillMatcher:
+    # Aho-Corasick automaton over the normalized skill names: one pass over
+    # the text finds every skill, however many are in the set.
+
+    def __init__(self, skills):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.skills = {}
+        for skill in skills:
+            key = normalize_text(skill)
+            if key and key not in self.skills:
+                self.skills[key] = skill
+                self._add(key)
+        self._build_failure_links()
+
+    def _add(self, key):
+        state = 0
+        for ch in key:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(key)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text, whole_words=True, normalized=False):
+        if not normalized:
+            text = normalize_text(text)
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for end, ch in enumerate(text, start=1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for key in output[state]:
+                if key in found:
+                    continue
+                start = end - len(key)
+                if not whole_words or (_boundary_before(text, start) and _boundary_after(text, end)):
+                    found.add(key)
+        return {self.skills[key] for key in found}
+
+
+@lru_cache(maxsize=32)
+def _matcher_for(skills):
+    return SkillMatcher(skills)
+
+
+def get_skill_matcher(skill_set):
+    # Built once per distinct skill set and reused for every CV in the run
+    # (and by each worker process for the batches it handles).
+    return _matcher_for(frozenset(skill_set))
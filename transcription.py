@@ -0,0 +1,282 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import model_registry
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+RECOGNIZERS = {
+    "google": "recognize_google",
+    "sphinx": "recognize_sphinx",
+    "vosk": "recognize_vosk",
+    "whisper": "recognize_whisper",
+    "faster_whisper": "recognize_faster_whisper"
+}
+# These run on the local machine and need no network access.
+OFFLINE_BACKENDS = ("sphinx", "vosk", "whisper", "faster_whisper")
+# speech_recognition loads these models again on every call, so every chunk
+# would pay for it. They are loaded once through the registry instead.
+WHISPER_MODEL = "base"
+SPHINX_LANGUAGE = "en-US"
+LOCAL_MODELS = {"sphinx": "asr_sphinx", "vosk": "asr_vosk", "whisper": "asr_whisper",
+                "faster_whisper": "asr_faster_whisper"}
+_whisper_lock = threading.Lock()
+
+
+def _speech_recognition_dir():
+    import speech_recognition as sr
+    return os.path.dirname(os.path.abspath(sr.__file__))
+
+
+class SphinxDecoders:
+    # A PocketSphinx decoder holds the utterance being decoded, so each chunk
+    # borrows one; decoders are created only when all are busy and reused
+    # after, also across videos.
+
+    def __init__(self, language=SPHINX_LANGUAGE):
+        data_dir = os.path.join(_speech_recognition_dir(), "pocketsphinx-data", language)
+        if not os.path.isdir(data_dir):
+            raise RuntimeError(f"missing PocketSphinx language data directory: {data_dir}")
+        self.paths = (os.path.join(data_dir, "acoustic-model"), os.path.join(data_dir, "language-model.lm.bin"),
+                      os.path.join(data_dir, "pronounciation-dictionary.dict"))
+        self.idle = queue.SimpleQueue()
+        self.idle.put(self._new_decoder())
+
+    def _new_decoder(self):
+        from pocketsphinx import pocketsphinx
+
+        hmm, lm, dictionary = self.paths
+        config = pocketsphinx.Config()
+        config.set_string("-hmm", hmm)
+        config.set_string("-lm", lm)
+        config.set_string("-dict", dictionary)
+        config.set_string("-logfn", os.devnull)
+        return pocketsphinx.Decoder(config)
+
+    def transcribe(self, pcm):
+        try:
+            decoder = self.idle.get_nowait()
+        except queue.Empty:
+            decoder = self._new_decoder()
+        try:
+            decoder.start_utt()
+            decoder.process_raw(pcm, False, True)
+            decoder.end_utt()
+            hypothesis = decoder.hyp()
+            return hypothesis.hypstr if hypothesis is not None else ""
+        finally:
+            self.idle.put(decoder)
+
+
+def load_whisper():
+    import whisper
+    return whisper.load_model(WHISPER_MODEL)
+
+
+def load_faster_whisper():
+    from faster_whisper import WhisperModel
+    return WhisperModel(WHISPER_MODEL)
+
+
+def load_vosk():
+    from vosk import Model
+
+    # Where speech_recognition's "sprc download vosk" puts it.
+    model_dir = os.path.join(_speech_recognition_dir(), "models", "vosk")
+    if not os.path.exists(model_dir):
+        raise RuntimeError(f"Vosk model not found at {model_dir}, run `sprc download vosk`")
+    return Model(model_dir)
+
+
+model_registry.register("asr_sphinx", SphinxDecoders)
+model_registry.register("asr_vosk", load_vosk)
+model_registry.register("asr_whisper", load_whisper)
+model_registry.register("asr_faster_whisper", load_faster_whisper)
+
+
+def extract_pcm(video_file, sample_rate=SAMPLE_RATE):
+    # Decode the audio track straight into memory as 16-bit mono PCM at the
+    # recognizers' native rate. Nothing is written to disk, so concurrent
+    # jobs in one directory no longer share a temp_audio.wav.
+    from imageio_ffmpeg import get_ffmpeg_exe
+
+    command = [get_ffmpeg_exe(), "-nostdin", "-loglevel", "error", "-i", video_file,
+               "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-acodec", "pcm_s16le", "-"]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.decode("utf-8", "replace").strip() or "ffmpeg failed")
+    if not process.stdout:
+        raise RuntimeError("no audio track found")
+    return process.stdout
+
+
+def _quietest_sample(samples, start, end, sample_rate, frame_seconds=0.02):
+    # Centre of the lowest-energy 20 ms frame between start and end.
+    frame_len = max(1, int(sample_rate * frame_seconds))
+    window = samples[start:end].astype(np.float32)
+    n_frames = len(window) // frame_len
+    if n_frames < 2:
+        return end
+    frames = window[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    return start + int(np.argmin(energy)) * frame_len + frame_len // 2
+
+
+def check_chunking(chunk_seconds, overlap_seconds=1.0, split_on_silence=False):
+    # Each chunk has to reach past the overlap, or the next one starts a
+    # sample after it and a few seconds of audio become thousands of
+    # recognizer requests.
+    if overlap_seconds < 0:
+        raise ValueError(f"overlap_seconds must not be negative, got {overlap_seconds}")
+    if chunk_seconds <= 0 or (not split_on_silence and chunk_seconds <= overlap_seconds):
+        raise ValueError(f"chunk_seconds must be more than the {overlap_seconds}s overlap, got {chunk_seconds}")
+
+
+def chunk_bounds(samples, sample_rate, chunk_seconds=30, overlap_seconds=1.0,
+                 split_on_silence=False, silence_window=5.0):
+    check_chunking(chunk_seconds, overlap_seconds, split_on_silence)
+    total = len(samples)
+    chunk_len = max(1, int(chunk_seconds * sample_rate))
+    overlap = int(overlap_seconds * sample_rate)
+    window = int(silence_window * sample_rate)
+    start = 0
+    while start < total:
+        end = min(start + chunk_len, total)
+        if split_on_silence and end < total:
+            # Cut in the quietest part of the last few seconds so no word is
+            # split, which also means the chunks need no overlap. The cut stays
+            # in the second half of the chunk so every step covers half of one.
+            end = _quietest_sample(samples, max(start + chunk_len // 2, end - window), end, sample_rate)
+        yield start, end
+        if end >= total:
+            break
+        start = end if split_on_silence else max(start + 1, end - overlap)
+
+
+def transcribe_local(pcm, sample_rate, backend):
+    # The models want 16 kHz 16-bit mono, which is what extract_pcm gives.
+    if sample_rate != SAMPLE_RATE:
+        raise ValueError(f"{backend} needs {SAMPLE_RATE} Hz audio, got {sample_rate} Hz")
+    model = model_registry.get(LOCAL_MODELS[backend])
+    if backend == "sphinx":
+        return model.transcribe(pcm)
+    if backend == "vosk":
+        from vosk import KaldiRecognizer
+
+        # The model is shared, each chunk gets its own recognizer.
+        recognizer = KaldiRecognizer(model, sample_rate)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult())["text"]
+    audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    if backend == "whisper":
+        import torch
+
+        # One PyTorch model already uses every core; chunks take turns.
+        with _whisper_lock:
+            return model.transcribe(audio, fp16=torch.cuda.is_available())["text"]
+    segments, _ = model.transcribe(audio)
+    return " ".join(segment.text for segment in segments)
+
+
+def transcribe_chunk(pcm, sample_rate, backend="google", language="en-US"):
+    if backend in ("vosk", "whisper", "faster_whisper") or (backend == "sphinx" and language == SPHINX_LANGUAGE):
+        return transcribe_local(pcm, sample_rate, backend)
+
+    import speech_recognition as sr
+
+    recognizer = sr.Recognizer()
+    audio_data = sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+    recognize = getattr(recognizer, RECOGNIZERS[backend])
+    try:
+        if backend in ("google", "sphinx"):
+            return recognize(audio_data, language=language)
+        return recognize(audio_data)
+    except sr.UnknownValueError:
+        # Silence or unintelligible speech, not a failure.
+        return ""
+
+
+def stream_chunks(blocks, sample_rate, chunk_seconds=30, overlap_seconds=1.0, split_on_silence=False):
+    # chunk_bounds over PCM that is still being decoded: a chunk is cut
+    # once samples past its end have arrived, which gives the same chunks
+    # as chunk_bounds over the whole recording. Yields (start, end, pcm).
+    buffer = bytearray()
+    offset = 0
+    for block in blocks:
+        buffer += block
+        samples = np.frombuffer(bytes(buffer[:len(buffer) // 2 * 2]), dtype=np.int16)
+        keep_from = 0
+        for start, end in chunk_bounds(samples, sample_rate, chunk_seconds, overlap_seconds, split_on_silence):
+            if end >= len(samples):
+                # The last chunk may still grow, cut it when more arrives.
+                keep_from = start
+                break
+            yield offset + start, offset + end, samples[start:end].tobytes()
+        del buffer[:keep_from * 2]
+        offset += keep_from
+    samples = np.frombuffer(bytes(buffer[:len(buffer) // 2 * 2]), dtype=np.int16)
+    for start, end in chunk_bounds(samples, sample_rate, chunk_seconds, overlap_seconds, split_on_silence):
+        yield offset + start, offset + end, samples[start:end].tobytes()
+
+
+def transcribe_pcm(pcm, sample_rate, backend="google", chunk_seconds=30, overlap_seconds=1.0,
+                   split_on_silence=False, workers=4, language="en-US"):
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    chunks = ((start, end, samples[start:end].tobytes())
+              for start, end in chunk_bounds(samples, sample_rate, chunk_seconds, overlap_seconds, split_on_silence))
+    return _transcribe_chunks(chunks, sample_rate, backend, workers, language)
+
+
+def transcribe_stream(blocks, sample_rate, backend="google", chunk_seconds=30, overlap_seconds=1.0,
+                      split_on_silence=False, workers=4, language="en-US"):
+    # transcribe_pcm for audio given as PCM blocks while it is decoded, so
+    # the first chunks are recognized before the recording is fully read.
+    chunks = stream_chunks(blocks, sample_rate, chunk_seconds, overlap_seconds, split_on_silence)
+    return _transcribe_chunks(chunks, sample_rate, backend, workers, language)
+
+
+def _transcribe_chunks(chunks, sample_rate, backend, workers, language):
+    segments = []
+    pending = deque()
+
+    def collect(future, start, end):
+        segment = {"start": round(start / sample_rate, 2), "end": round(end / sample_rate, 2),
+                   "text": "", "error": None}
+        try:
+            segment["text"] = future.result()
+        except Exception as e:
+            segment["error"] = str(e)
+        segments.append(segment)
+
+    # At most 2 * workers chunks are in flight, so a long recording is never
+    # copied into more than a handful of requests at once.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start, end, chunk in chunks:
+            pending.append((executor.submit(transcribe_chunk, chunk, sample_rate, backend, language), start, end))
+            if len(pending) >= 2 * workers:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+    return segments
+
+
+def stitch_segments(segments, max_overlap_words=12):
+    # Overlapping chunks repeat a few words at each seam, drop the longest
+    # run that the next chunk starts with and the stitched text ends with.
+    words = []
+    for segment in segments:
+        next_words = segment["text"].split()
+        limit = min(max_overlap_words, len(words), len(next_words))
+        for k in range(limit, 0, -1):
+            if [w.lower() for w in words[-k:]] == [w.lower() for w in next_words[:k]]:
+                next_words = next_words[k:]
+                break
+        words.extend(next_words)
+    return " ".join(words)
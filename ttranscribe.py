@@ -1,6 +1,5 @@
 import os
 import re
-import moviepy as mp
 import speech_recognition as sr
 import spacy
 import pdfplumber
@@ -9,6 +8,8 @@ import numpy as np
 from keras.models import model_from_json
 from nltk.sentiment import SentimentIntensityAnalyzer
 import nltk
+from skill_matcher import get_skill_matcher, normalize_text
+from transcription import SAMPLE_RATE, SAMPLE_WIDTH, extract_pcm
 
 nltk.download('vader_lexicon')
 nlp = spacy.load("en_core_web_sm")
@@ -31,17 +32,14 @@ def extract_features(image):
 
 def video_to_text(video_file, output_text_file):
     try:
-        video = mp.VideoFileClip(video_file)
-        audio_file = "temp_audio.wav"
-        video.audio.write_audiofile(audio_file)
+        pcm = extract_pcm(video_file)
     except Exception as e:
         return f"Error in extracting audio: {e}"
 
     recognizer = sr.Recognizer()
     try:
-        with sr.AudioFile(audio_file) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
+        audio_data = sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH)
+        text = recognizer.recognize_google(audio_data)
     except Exception as e:
         return f"Error in audio transcription: {e}"
 
@@ -63,12 +61,10 @@ def analyze_text(text):
 
 
 def find_matching_skills(skills_found, required_skills):
-    normalized_skills_found = {skill.lower() for skill in skills_found}
-    matching_skills = {
-        req_skill for req_skill in required_skills
-        if any(req_skill in skill for skill in normalized_skills_found)
-    }
-    return matching_skills
+    # One automaton pass over all found skills instead of testing every
+    # required skill against every found skill.
+    found_text = "\n".join(normalize_text(skill) for skill in skills_found)
+    return get_skill_matcher(required_skills).find(found_text, whole_words=False, normalized=True)
 
 
 def extract_name(cv_text, doc):
@@ -0,0 +1,274 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+import final_3
+import transcription
+from result_sinks import drop_torn_line
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v")
+
+
+def list_videos(source):
+    # A directory of videos, or a manifest with one path (or one JSON object
+    # with a "path" key) per line.
+    if os.path.isdir(source):
+        return [os.path.join(source, f) for f in sorted(os.listdir(source)) if f.lower().endswith(VIDEO_EXTENSIONS)]
+    videos = []
+    with open(source, "r", encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            videos.append(json.loads(line)["path"] if line.startswith("{") else line)
+    return videos
+
+
+def completed_videos(output_path):
+    # Videos whose last record has no error. A failed video (say its
+    # transcription request failed) runs again, and the record appended for
+    # it supersedes the failed one.
+    errors = {}
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "r", encoding="utf-8") as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+                errors[record["video"]] = record.get("error")
+            except (ValueError, KeyError):
+                # A torn last line from a crash, that video runs again.
+                continue
+    return {video for video, error in errors.items() if error is None}
+
+
+class VideoBatchRunner:
+    # decode -> detect -> inference, plus decode -> transcription, each stage
+    # with its own thread pool and bounded queues in between so a slow stage
+    # holds back decoding instead of buffering whole videos in memory.
+
+    def __init__(self, output_path, sample_every=0.5, batch_size=32, backend="google", chunk_seconds=30,
+                 detector_backend="haar", detect_max_width=None, decode_workers=2, detect_workers=2,
+                 inference_workers=1, transcribe_workers=2, transcribe_threads=4, queue_size=64):
+        final_3.check_video_options(sample_every, chunk_seconds)
+        self.output_path = output_path
+        self.sample_every = sample_every
+        self.batch_size = batch_size
+        self.backend = backend
+        self.chunk_seconds = chunk_seconds
+        self.detector_backend = detector_backend
+        self.detect_max_width = detect_max_width
+        self.workers = {"decode": decode_workers, "detect": detect_workers,
+                        "inference": inference_workers, "transcribe": transcribe_workers}
+        self.transcribe_threads = transcribe_threads
+        self.video_queue = queue.Queue()
+        self.frame_queue = queue.Queue(queue_size)
+        self.face_queue = queue.Queue(queue_size)
+        # Whole-video PCM is ~2 MB per minute, keep only a few waiting.
+        self.audio_queue = queue.Queue(max(1, decode_workers))
+        self.states = {}
+        self.state_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.output = None
+        self.written = 0
+        self.failed = 0
+
+    def _update(self, video, **changes):
+        with self.state_lock:
+            state = self.states[video]
+            for key, value in changes.items():
+                if key in ("frames_detected", "faces_pending"):
+                    state[key] += value
+                elif key == "labels":
+                    state["timeline"].extend(value)
+                else:
+                    state[key] = value
+            done = (state["frames_total"] is not None and state["frames_detected"] == state["frames_total"]
+                    and state["faces_pending"] == 0 and state["segments"] is not None)
+            if done:
+                del self.states[video]
+        if done:
+            self._write(video, state)
+
+    def _write(self, video, state):
+        timeline = sorted(state["timeline"])
+        emotions_detected = [label for _, label in timeline]
+        result = final_3.video_resume_result(emotions_detected, timeline, state["transcript"],
+                                             state["segments"], verbose=False)
+        record = {"video": video, "error": state["error"]}
+        record.update(result)
+        if record["error"] is None and record["transcript"].startswith("Error"):
+            record["error"] = record["transcript"]
+        record["timings"] = {"total": round(time.perf_counter() - state["started"], 3)}
+        line = json.dumps(record) + "\n"
+        with self.write_lock:
+            self.output.write(line)
+            self.output.flush()
+            os.fsync(self.output.fileno())
+            self.written += 1
+            if record["error"]:
+                self.failed += 1
+        print(f"Finished {video}")
+
+    def _read_audio(self, video, audio_blocks):
+        try:
+            pcm = b"".join(audio_blocks())
+        except Exception as e:
+            pcm = b""
+            print(f"Warning: audio decode failed for {video}: {e}")
+        if pcm:
+            self.audio_queue.put((video, pcm))
+        else:
+            self._update(video, segments=[], transcript="Error in audio transcription: no audio track found")
+
+    def decode_worker(self):
+        while True:
+            video = self.video_queue.get()
+            if video is None:
+                break
+            with self.state_lock:
+                self.states[video] = {"frames_total": None, "frames_detected": 0, "faces_pending": 0,
+                                      "timeline": [], "segments": None, "transcript": "", "error": None,
+                                      "started": time.perf_counter()}
+            count = 0
+            error = None
+            try:
+                frames, audio_blocks, close = final_3.open_video_streams(video, self.sample_every)
+            except Exception as e:
+                error = f"Error in decoding video: {e}"
+                self._update(video, segments=[], transcript="")
+            else:
+                audio_thread = threading.Thread(target=self._read_audio, args=(video, audio_blocks), daemon=True)
+                audio_thread.start()
+                try:
+                    for timestamp, gray in frames:
+                        self.frame_queue.put((video, timestamp, gray))
+                        count += 1
+                except Exception as e:
+                    error = f"Error in decoding video: {e}"
+                finally:
+                    close()
+                audio_thread.join()
+            self._update(video, frames_total=count, error=error)
+
+    def detect_worker(self):
+        # No tracking here, frames of one video reach different workers.
+        face_detector = final_3.make_face_detector(self.detector_backend, self.detect_max_width)
+        while True:
+            item = self.frame_queue.get()
+            if item is None:
+                break
+            video, timestamp, gray = item
+            try:
+                crops = [cv2.resize(gray[y:y + h, x:x + w], (48, 48)) for (x, y, w, h) in face_detector.detect(gray)]
+            except Exception as e:
+                crops = []
+                print(f"Warning: face detection failed in {video} at {timestamp}s: {e}")
+            # Count the faces before the frame so the video cannot look
+            # finished while its faces are still queued.
+            self._update(video, faces_pending=len(crops))
+            for crop in crops:
+                self.face_queue.put((video, timestamp, crop))
+            self._update(video, frames_detected=1)
+
+    def _predict(self, pending):
+        try:
+            labels = final_3.predict_emotions([crop for _, _, crop in pending], self.batch_size)
+        except Exception as e:
+            labels = [None] * len(pending)
+            print(f"Warning: emotion inference failed: {e}")
+        by_video = {}
+        for (video, timestamp, _), label in zip(pending, labels):
+            by_video.setdefault(video, []).append((timestamp, label))
+        for video, predicted in by_video.items():
+            self._update(video, labels=[item for item in predicted if item[1] is not None],
+                         faces_pending=-len(predicted))
+
+    def inference_worker(self):
+        # Batches mix faces from different videos; a partial batch is run
+        # as soon as the queue goes quiet.
+        pending = []
+        while True:
+            try:
+                item = self.face_queue.get(timeout=0.05 if pending else None)
+            except queue.Empty:
+                self._predict(pending)
+                pending = []
+                continue
+            if item is None:
+                break
+            pending.append(item)
+            if len(pending) >= self.batch_size:
+                self._predict(pending)
+                pending = []
+        if pending:
+            self._predict(pending)
+
+    def transcribe_worker(self):
+        while True:
+            item = self.audio_queue.get()
+            if item is None:
+                break
+            video, pcm = item
+            try:
+                segments = transcription.transcribe_pcm(pcm, transcription.SAMPLE_RATE, self.backend,
+                                                        self.chunk_seconds, workers=self.transcribe_threads)
+                transcript = final_3.transcript_from_segments(segments)
+            except Exception as e:
+                segments = []
+                transcript = f"Error in audio transcription: {e}"
+            self._update(video, segments=segments, transcript=transcript)
+
+    def _start(self, stage, target):
+        threads = [threading.Thread(target=target, name=f"{stage}-{i}", daemon=True)
+                   for i in range(max(1, self.workers[stage]))]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _stop(self, threads, stage_queue):
+        for _ in threads:
+            stage_queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def run(self, videos):
+        done = completed_videos(self.output_path)
+        todo = [video for video in videos if video not in done]
+        print(f"{len(todo)} videos to analyze ({len(videos) - len(todo)} already in {self.output_path}).")
+
+        # Warm the models before the workers race to load them.
+        final_3.warm_up_models(*final_3.VIDEO_MODELS)
+        if os.path.dirname(self.output_path):
+            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        drop_torn_line(self.output_path)
+        with open(self.output_path, "a", encoding="utf-8") as self.output:
+            for video in todo:
+                self.video_queue.put(video)
+            decoders = self._start("decode", self.decode_worker)
+            detectors = self._start("detect", self.detect_worker)
+            inference = self._start("inference", self.inference_worker)
+            transcribers = self._start("transcribe", self.transcribe_worker)
+
+            self._stop(decoders, self.video_queue)
+            self._stop(detectors, self.frame_queue)
+            self._stop(inference, self.face_queue)
+            self._stop(transcribers, self.audio_queue)
+        self.output = None
+        return {"analyzed": self.written, "failed": self.failed, "skipped": len(videos) - len(todo)}
+
+
+def run_video_batch(source, output_path, **options):
+    return VideoBatchRunner(output_path, **options).run(list_videos(source))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python video_batch.py <video folder or manifest> <results.jsonl>")
+        sys.exit(2)
+    print(run_video_batch(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,109 @@
+import os
+import queue
+import subprocess
+import threading
+from functools import partial
+
+import cv2
+import numpy as np
+
+from transcription import SAMPLE_RATE
+
+# One second of 16 kHz 16-bit mono PCM.
+AUDIO_BLOCK_BYTES = SAMPLE_RATE * 2
+
+
+def can_demux_once():
+    # The audio stream goes out on an extra pipe handed to ffmpeg via
+    # pass_fds, which Windows does not support.
+    return os.name == "posix"
+
+
+def probe_video(video_file):
+    webcam = cv2.VideoCapture(video_file)
+    try:
+        if not webcam.isOpened():
+            raise RuntimeError(f"cannot open {video_file}")
+        return int(webcam.get(cv2.CAP_PROP_FRAME_WIDTH)), int(webcam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        webcam.release()
+
+
+def has_audio(video_file):
+    # ffmpeg with no output only prints the stream list, no decoding.
+    from imageio_ffmpeg import get_ffmpeg_exe
+
+    probe = subprocess.run([get_ffmpeg_exe(), "-hide_banner", "-nostdin", "-i", video_file],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return b"Audio:" in probe.stderr
+
+
+def _gray_frames(stream, width, height, sample_every):
+    frame_size = width * height
+    index = 0
+    try:
+        while True:
+            data = stream.read(frame_size)
+            if len(data) < frame_size:
+                break
+            yield round(index * sample_every, 2), np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+            index += 1
+    finally:
+        # Closing early makes ffmpeg stop instead of blocking on a full pipe.
+        stream.close()
+
+
+def _pcm_blocks(stream, block_bytes=AUDIO_BLOCK_BYTES):
+    # A thread drains the audio pipe as fast as ffmpeg writes it, so a
+    # recognizer that falls behind never holds up the frames.
+    blocks = queue.SimpleQueue()
+
+    def drain():
+        try:
+            while True:
+                block = stream.read(block_bytes)
+                if not block:
+                    break
+                blocks.put(block)
+        finally:
+            stream.close()
+            blocks.put(None)
+
+    threading.Thread(target=drain, name="audio-drain", daemon=True).start()
+    while True:
+        block = blocks.get()
+        if block is None:
+            return
+        yield block
+
+
+def demux(video_file, sample_every=0.5, sample_rate=SAMPLE_RATE):
+    # One ffmpeg process reads the container once and writes sampled
+    # grayscale frames to stdout and 16 kHz mono PCM to a second pipe.
+    # Both must be consumed concurrently or ffmpeg stalls on a full pipe;
+    # audio_blocks() yields the PCM in blocks as it is decoded.
+    from imageio_ffmpeg import get_ffmpeg_exe
+
+    width, height = probe_video(video_file)
+    command = [get_ffmpeg_exe(), "-nostdin", "-loglevel", "error", "-i", video_file,
+               "-map", "0:v:0", "-vf", f"fps={1 / sample_every},format=gray",
+               "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+    if not has_audio(video_file):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return process, _gray_frames(process.stdout, width, height, sample_every), lambda: iter(())
+
+    audio_read, audio_write = os.pipe()
+    command += ["-map", "0:a:0", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-acodec", "pcm_s16le",
+                f"pipe:{audio_write}"]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   pass_fds=(audio_write,))
+    except Exception:
+        os.close(audio_read)
+        raise
+    finally:
+        os.close(audio_write)
+
+    frames = _gray_frames(process.stdout, width, height, sample_every)
+    audio_stream = os.fdopen(audio_read, "rb")
+    return process, frames, partial(_pcm_blocks, audio_stream)